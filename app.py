@@ -1,9 +1,25 @@
+import hashlib
+import json
+import os
 import requests
-from googlesearch import search
 import re
+import threading
+import time
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from functools import partial
 from urllib.parse import urlparse
-from weasyprint import HTML
-from typing import List, Dict, Any
+from transport import get_session
+from limiter import get_backend, register_host
+from cache import ResponseCache, cache_key, get_response_cache
+from cik_index import get_cik_index
+from doc_index import get_document_index
+from manifest import RunManifest
+from prompt_catalog import is_sector_level
+from report_discovery import get_report_discovery, is_transient_status
+from metrics import Metrics, error_class, metrics as global_metrics, record_call
+from sec_filings import convert_html_to_pdf, write_10k_text
+from uploads import MultipartFile, ProgressCallback, file_sha256, get_upload_index
 
 # Configuration for SEC requests
 SEC_HEADERS = {
@@ -23,81 +39,221 @@ DOWNLOAD_HEADERS = {
 
 # API base URL for the document database
 API_BASE = "http://98.82.33.222:2345"
+register_host(urlparse(API_BASE).hostname, "api")
 
-def normalize_company_name(name):
-    return re.sub(r"[^a-zA-Z0-9]", "", name).lower()
+# Uploads are parsed and embedded server-side before the response comes back
+UPLOAD_TIMEOUT = (5, 600)
 
-def find_annual_report_pdf(company_name, max_results=20):
-    query = f'"{company_name}" "annual report" filetype:pdf'
-    print(f"Searching Google for: {query}")
-    
-    results = list(search(query, num_results=max_results))
-    
-    norm_name = normalize_company_name(company_name)
+# How 10-K filings are ingested: "pdf" renders the HTML with WeasyPrint in a
+# memory-capped subprocess, "text" uploads the extracted Item 1/1A/7/7A/8 sections
+TEN_K_INGEST_MODE = os.environ.get("TEN_K_INGEST_MODE", "pdf")
 
-    scored_links = []
-    for url in results:
-        if not url.lower().endswith(".pdf"):
-            continue
-        score = 0
+# Download retries (interrupted PDF downloads resume with HTTP Range)
+DOWNLOAD_ATTEMPTS = 3
+
+# Annual-report candidates tried in order before web acquisition gives up
+REPORT_DOWNLOAD_CANDIDATES = 3
+
+# Acceptable document sizes for upload
+MIN_DOCUMENT_BYTES = 1024
+MAX_DOCUMENT_BYTES = 500 * 1024 * 1024
 
-        if "annual" in url.lower():
-            score += 2
+# Analysis modes offered by the UI
+SEARCH_MODES = ("Documents Only", "Web Only", "Hybrid")
 
-        domain = urlparse(url).netloc
-        if norm_name in normalize_company_name(domain):
-            score += 3
+# Maximum number of prompts in flight at once during batch runs
+MAX_CONCURRENT_QUERIES = 8
 
-        if "2024" in url or "fy2024" in url.lower():
-            score += 1
+# Hybrid synthesis input budget (both legs combined), approximated from characters
+SYNTHESIS_TOKEN_BUDGET = 1500
+CHARS_PER_TOKEN = 4
 
-        scored_links.append((score, url))
+# Responses to search_type=synthesis that mean the server does not support it
+SYNTHESIS_UNSUPPORTED_STATUSES = (400, 404, 422)
+
+# Maximum number of queries posted in a single /query/batch request
+QUERY_BATCH_SIZE = 25
+
+# Prompts on the sector allow-list (sector_prompts.txt) are asked once per sector and the
+# web answer is reused across companies in that sector for this many seconds
+SECTOR_FRESHNESS = 24 * 3600
+
+# Web queries currently being fetched, shared by all HybridSearch instances in the process
+_inflight_queries: Dict[str, Future] = {}
+_inflight_lock = threading.Lock()
+
+def google_search(query, num_results=10):
+    # googlesearch (and BeautifulSoup behind it) is only needed to onboard new companies,
+    # so it is imported on first use rather than on every start
+    from googlesearch import search
+    # googlesearch uses its own requests, so it is guarded here rather than by the shared session
+    backend = get_backend("google")
+    backend.enter()
+    started = time.perf_counter()
+    try:
+        results = list(search(query, num_results=num_results))
+    except Exception:
+        backend.exit(time.perf_counter() - started, True, True)
+        raise
+    except BaseException:
+        backend.abandon()
+        raise
+    backend.exit(time.perf_counter() - started, False, False)
+    return results
 
-    if not scored_links:
+def report_discovery():
+    return get_report_discovery(google_search, DOWNLOAD_HEADERS, min_bytes=MIN_DOCUMENT_BYTES, max_bytes=MAX_DOCUMENT_BYTES)
+
+def find_annual_report_candidates(company_name, max_results=20):
+    """Annual-report PDF URLs for a company, best first (cached per company)"""
+    return report_discovery().candidates(company_name, max_results)
+
+def find_annual_report_pdf(company_name, max_results=20):
+    candidates = find_annual_report_candidates(company_name, max_results)
+    if not candidates:
         print("No PDF found.")
         return None
+    return candidates[0]
 
-    scored_links.sort(reverse=True)
-    best_url = scored_links[0][1]
-    print(f"Selected PDF: {best_url}")
-    return best_url
+def document_filename(company_name, report_type):
+    return f"{company_name.replace(' ', '_')}_{report_type}.pdf"
 
-def download_pdf(url, company_name, report_type="Annual_Report"):
-    try:
-        response = requests.get(url, stream=True, headers=DOWNLOAD_HEADERS, timeout=15)
-        response.raise_for_status()
+def partial_download_path(filename, url):
+    """Partial file for one URL, so a download is only ever resumed from the same source"""
+    root, ext = os.path.splitext(filename)
+    return f"{root}.{hashlib.sha256(url.encode('utf-8')).hexdigest()[:12]}{ext}.part"
 
-        filename = f"{company_name.replace(' ', '_')}_{report_type}.pdf"
-        with open(filename, "wb") as f:
-            for chunk in response.iter_content(1024):
-                f.write(chunk)
-        print(f"Downloaded to: {filename}")
-        return filename
-    except Exception as e:
-        print(f"Failed to download PDF: {e}")
+def discard_partial_download(part_path):
+    for path in (part_path, part_path + ".validator"):
+        if os.path.exists(path):
+            os.remove(path)
+
+def content_range_start(response):
+    """First byte offset of a 206 response's Content-Range, or None if it is missing or malformed"""
+    match = re.match(r"bytes (\d+)-\d+/(\d+|\*)$", response.headers.get("Content-Range", "").strip())
+    return int(match.group(1)) if match else None
+
+def download_pdf(url, company_name, report_type="Annual_Report", failure: Dict[str, Any] = None):
+    """Download a PDF, resuming a partial file from the same URL; returns the path or None.
+
+    On failure, failure["permanent"] (when a dict is given) says whether the URL is not worth retrying.
+    """
+    failure = {} if failure is None else failure
+    failure["permanent"] = False
+    filename = document_filename(company_name, report_type)
+    part_path = partial_download_path(filename, url)
+    validator_path = part_path + ".validator"
+
+    for attempt in range(1, DOWNLOAD_ATTEMPTS + 1):
+        started = time.perf_counter()
+        response = None
+        try:
+            # Resume an interrupted download from where it stopped, unless the file has changed since
+            offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+            headers = dict(DOWNLOAD_HEADERS)
+            if offset:
+                headers["Range"] = f"bytes={offset}-"
+                if os.path.exists(validator_path):
+                    with open(validator_path) as f:
+                        headers["If-Range"] = f.read().strip()
+
+            response = get_session().get(url, stream=True, headers=headers, timeout=15)
+            if response.status_code == 416:
+                # Range not satisfiable: the partial file is already complete
+                break
+            response.raise_for_status()
+
+            content_type = response.headers.get("Content-Type", "").lower()
+            if content_type and not any(t in content_type for t in ("pdf", "octet-stream")):
+                print(f"Skipping {url}: unexpected content type {content_type}")
+                failure["permanent"] = True
+                return None
+            # 206 continues the partial file; a plain 200 means the server ignored Range or If-Range
+            # found the file changed, so it starts over
+            resuming = response.status_code == 206
+            if resuming and content_range_start(response) != offset:
+                discard_partial_download(part_path)
+                raise ValueError(f"Content-Range {response.headers.get('Content-Range')!r} does not continue at byte {offset}")
+
+            content_length = int(response.headers.get("Content-Length") or 0)
+            if (offset if resuming else 0) + content_length > MAX_DOCUMENT_BYTES:
+                print(f"Skipping {url}: {content_length} bytes exceeds size limit")
+                failure["permanent"] = True
+                return None
+
+            if not resuming:
+                # If-Range only accepts strong ETags
+                etag = response.headers.get("ETag", "")
+                validator = etag if etag and not etag.startswith("W/") else response.headers.get("Last-Modified")
+                if validator:
+                    with open(validator_path, "w") as f:
+                        f.write(validator)
+                elif os.path.exists(validator_path):
+                    os.remove(validator_path)
+            mode = "ab" if resuming else "wb"
+            received = 0
+            with open(part_path, mode) as f:
+                for chunk in response.iter_content(64 * 1024):
+                    f.write(chunk)
+                    received += len(chunk)
+            record_call("download", "pdf", started, response, response_bytes=received)
+            break
+        except Exception as e:
+            record_call("download", "pdf", started, response, response_bytes=0, error=error_class(e))
+            print(f"Failed to download PDF (attempt {attempt}/{DOWNLOAD_ATTEMPTS}): {e}")
+            status = getattr(getattr(e, "response", None), "status_code", None)
+            if isinstance(e, requests.exceptions.HTTPError) and not is_transient_status(status):
+                # Gone or forbidden: retrying will not help
+                failure["permanent"] = True
+                return None
+        finally:
+            if response is not None:
+                # Streamed responses hold a backend slot until closed
+                response.close()
+    else:
         return None
 
-def get_cik_from_name(name):
-    url = "https://www.sec.gov/files/company_tickers.json"
-    response = requests.get(url, headers=SEC_HEADERS)
-    if not response.ok:
-        print("Failed to get CIK list:", response.status_code)
+    if not verify_document(part_path):
+        discard_partial_download(part_path)
+        failure["permanent"] = True
         return None
+    os.replace(part_path, filename)
+    if os.path.exists(validator_path):
+        os.remove(validator_path)
+    print(f"Downloaded to: {filename}")
+    return filename
 
-    data = response.json()
-    for entry in data.values():
-        if name.lower() in entry["title"].lower():
-            return str(entry["cik_str"]).zfill(10)
-    return None
+def verify_document(path):
+    """Check a downloaded document is non-trivial, within size limits and, for PDFs, really a PDF"""
+    if not path or not os.path.exists(path):
+        return False
+    size = os.path.getsize(path)
+    if size < MIN_DOCUMENT_BYTES or size > MAX_DOCUMENT_BYTES:
+        print(f"Rejecting {path}: size {size} bytes outside allowed range")
+        return False
+    if path.endswith((".pdf", ".pdf.part")):
+        with open(path, "rb") as f:
+            if not f.read(1024).lstrip().startswith(b"%PDF"):
+                print(f"Rejecting {path}: not a PDF file")
+                return False
+    return True
+
+def get_cik_from_name(name):
+    return get_cik_index(SEC_HEADERS).lookup(name)
 
 def get_latest_10k_url(cik):
     url = f"https://data.sec.gov/submissions/CIK{cik}.json"
-    response = requests.get(url, headers=SEC_HEADERS)
+    started = time.perf_counter()
+    response = get_session().get(url, headers=SEC_HEADERS)
+    record_call("sec", "submissions", started, response, error=None if response.ok else f"http_{response.status_code}")
     if not response.ok:
         print("Failed to get filings:", response.status_code)
         return None
 
-    data = response.json()
+    return latest_10k_url_from_submissions(cik, response.json())
+
+def latest_10k_url_from_submissions(cik, data):
+    """URL of the most recent 10-K primary document in an EDGAR submissions payload"""
     recent = data.get("filings", {}).get("recent", {})
     for i, form in enumerate(recent.get("form", [])):
         if form == "10-K":
@@ -106,7 +262,7 @@ def get_latest_10k_url(cik):
             return f"https://www.sec.gov/Archives/edgar/data/{int(cik)}/{acc_num}/{doc}"
     return None
 
-def download_sec_10k(company_name):
+def download_sec_10k(company_name, mode=None):
     cik = get_cik_from_name(company_name)
     if not cik:
         print("Company not found in SEC database.")
@@ -119,170 +275,206 @@ def download_sec_10k(company_name):
         return None
 
     print("Downloading 10-K HTML:", url)
-    response = requests.get(url, headers=SEC_HEADERS)
+    started = time.perf_counter()
+    response = get_session().get(url, headers=SEC_HEADERS)
+    record_call("sec", "10k_html", started, response, error=None if response.ok else f"http_{response.status_code}")
     if not response.ok:
         print("Download failed:", response.status_code)
         return None
 
-    html_content = response.text
-    pdf_filename = f"{company_name.replace(' ', '_')}_10-K.pdf"
+    return save_10k(company_name, response.text, url, mode)
 
-    try:
-        HTML(string=html_content, base_url=url).write_pdf(pdf_filename)
-        print(f"Saved SEC 10-K PDF to: {pdf_filename}")
-        return pdf_filename
-    except Exception as e:
-        print("PDF conversion failed:", str(e))
+def save_10k(company_name, html_content, url, mode=None):
+    """Write a fetched 10-K as extracted text or a rendered PDF (per TEN_K_INGEST_MODE); returns the path"""
+    mode = mode or TEN_K_INGEST_MODE
+    base_name = company_name.replace(' ', '_') + "_10-K"
+
+    if mode == "text":
+        text_filename = f"{base_name}.txt"
+        stats = write_10k_text(html_content, text_filename)
+        if stats["ok"]:
+            print(f"Saved SEC 10-K sections ({stats['sections']}) to: {text_filename} "
+                  f"[{stats['seconds']:.1f}s, peak RSS {stats['peak_mb']:.0f} MB]")
+            return text_filename
+        print("Text extraction failed:", stats["error"])
         return None
 
+    pdf_filename = f"{base_name}.pdf"
+    stats = convert_html_to_pdf(html_content, url, pdf_filename)
+    if stats["ok"]:
+        print(f"Saved SEC 10-K PDF to: {pdf_filename} "
+              f"[{stats['seconds']:.1f}s, peak RSS {stats['peak_mb']:.0f} MB]")
+        return pdf_filename
+    print("PDF conversion failed:", stats["error"])
+    return None
+
 def download_web_annual_report(company_name):
-    url = find_annual_report_pdf(company_name)
-    if url:
-        return download_pdf(url, company_name, "Annual_Report")
+    discovery = report_discovery()
+    filename = document_filename(company_name, "Annual_Report")
+    for url in find_annual_report_candidates(company_name)[:REPORT_DOWNLOAD_CANDIDATES]:
+        failure = {}
+        path = download_pdf(url, company_name, "Annual_Report", failure)
+        if path:
+            discovery.mark_succeeded(company_name, url)
+            return path
+        discovery.mark_failed(company_name, url, permanent=failure["permanent"])
+        if failure["permanent"]:
+            # Dropped candidates are not tried again; a transient failure keeps its partial file to resume
+            discard_partial_download(partial_download_path(filename, url))
+        print("Trying next annual report candidate")
     return None
 
-def get_existing_documents():
-    """Retrieves all existing documents from the vector database"""
-    try:
-        response = requests.get(f"{API_BASE}/documents")
-        response.raise_for_status()
-        # Parse the JSON response properly
-        documents = response.json()
-        # Make sure we're working with the right data structure
-        if isinstance(documents, str):
-            # If the API returns a string instead of parsed JSON
-            import json
-            try:
-                documents = json.loads(documents)
-            except:
-                print("Failed to parse API response as JSON")
-                return []
-        
-        # Handle the case where the response might be nested
-        if isinstance(documents, dict) and 'documents' in documents:
-            documents = documents['documents']
-            
-        return documents
-    except Exception as e:
-        print(f"Error retrieving document list: {str(e)}")
-        return []
+def fetch_documents(params: Dict[str, Any] = None):
+    """Fetches the raw /documents payload: a list, or a dict with 'documents' and an optional cursor"""
+    started = time.perf_counter()
+    response = get_session().get(f"{API_BASE}/documents", params=params)
+    record_call("documents", "list", started, response, error=None if response.ok else f"http_{response.status_code}")
+    response.raise_for_status()
+    documents = response.json()
+    if isinstance(documents, str):
+        # If the API returns a string instead of parsed JSON
+        documents = json.loads(documents)
+    return documents
 
-def find_company_documents(company_name, existing_docs):
-    """Find documents related to a specific company in the existing documents list"""
-    normalized_name = normalize_company_name(company_name)
-    company_docs = []
-    
-    print(f"Looking for documents matching company: {company_name}")
-    print(f"Existing documents format: {type(existing_docs)}")
-    
-    # Add debug information
-    if existing_docs and len(existing_docs) > 0:
-        print(f"Sample document: {existing_docs[0]}")
-    
-    # Handle different potential formats
-    for doc in existing_docs:
-        # Handle case where doc might be a string or other type
-        if not isinstance(doc, dict):
-            print(f"Skipping non-dictionary document: {doc}")
-            continue
-            
-        filename = doc.get("file_name", "")
-        if filename:
-            filename = filename.lower()
-            if normalized_name in normalize_company_name(filename):
-                company_docs.append(doc)
-    
-    return company_docs
+def upload_and_get_doc_id(file_path: str, progress: ProgressCallback = None) -> str:
+    """Upload document and return doc_id.
 
-def upload_and_get_doc_id(file_path: str) -> str:
-    """Upload document and return doc_id"""
+    The file is streamed from disk; a file whose content was already uploaded returns the
+    existing doc_id without sending any bytes. progress(sent, total) is called as it uploads.
+    """
+    started = time.perf_counter()
+    upload_response = None
     try:
-        with open(file_path, 'rb') as f:
-            upload_response = requests.post(
+        digest = file_sha256(file_path)
+        uploads = get_upload_index()
+        doc_id = uploads.get(digest)
+        if doc_id:
+            if get_document_index(fetch_documents).contains(doc_id):
+                record_call("upload", "upload", started, cache_hit=True)
+                print(f"Document {file_path} already uploaded (same content). doc_id: {doc_id}")
+                if progress:
+                    size = os.path.getsize(file_path)
+                    progress(size, size)
+                return doc_id
+            # Removed from the database since; upload it again
+            uploads.discard(digest)
+
+        with MultipartFile(file_path, progress=progress) as body:
+            upload_response = get_session().post(
                 f"{API_BASE}/upload/",
-                files={'file': f},
-                headers={'Accept': 'application/json'}
+                data=body,
+                headers={
+                    'Accept': 'application/json',
+                    'Content-Type': body.content_type,
+                    'X-Content-SHA256': digest
+                },
+                timeout=UPLOAD_TIMEOUT
             )
         upload_response.raise_for_status()
+        record_call("upload", "upload", started, upload_response)
         data = upload_response.json()
         doc_id = data.get('doc_id')
 
         if doc_id:
             print(f"Document {file_path} uploaded and processed. doc_id: {doc_id}")
+            get_document_index(fetch_documents).add(doc_id, os.path.basename(file_path))
+            uploads.add(digest, doc_id, os.path.basename(file_path))
             return doc_id
         else:
             print(f"Upload response missing doc_id: {data}")
             return None
 
     except Exception as e:
+        record_call("upload", "upload", started, upload_response, error=error_class(e))
         print(f"Failed to upload {file_path}: {str(e)}")
         return None
 
-class HybridSearch:
-    def __init__(self, api_base: str = API_BASE):
-        self.api_base = api_base
-        self.default_headers = {"Accept": "application/json"}
-        
-    def _query_source(self, params: Dict[str, Any]) -> str:
-        try:
-            # Properly handle list of doc_ids
-            query_params = []
-            for key, value in params.items():
-                if isinstance(value, list):
-                    for item in value:
-                        query_params.append((key, item))
-                else:
-                    query_params.append((key, value))
-
-            response = requests.get(
-                f"{self.api_base}/query/",
-                params=query_params,
-                headers=self.default_headers
-            )
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.HTTPError as e:
-            print(f"Error querying {params.get('search_type', 'unknown')}: {str(e)}")
-            return ""
-        except Exception as e:
-            print(f"Unexpected error: {str(e)}")
-            return ""
+def extract_content(response) -> str:
+    """Answer text of a /query/ response, which may be a JSON object or a bare string.
 
-    def query_documents(self, query: str, doc_ids: List[str] = None) -> str:
-        params = {
+    HybridSearch applies this to every response it receives, so its methods return plain strings.
+    """
+    if isinstance(response, dict):
+        return response.get("content", "")
+    return response or ""
+
+def stream_outcome(tokens: Iterator[str], outcome: Dict[str, Any]) -> Iterator[str]:
+    """Pass a stream_prompt generator through, storing whether it completed in outcome["complete"]"""
+    outcome["complete"] = yield from tokens
+
+def _trim_pair(first: str, second: str, max_chars: int) -> Tuple[str, str]:
+    """Trim two texts to a combined length, giving either one the other's unused share"""
+    half = max_chars // 2
+    first_limit = max(half, max_chars - min(len(second), half))
+    second_limit = max_chars - min(len(first), first_limit)
+
+    def trim(text, limit):
+        if len(text) <= limit:
+            return text
+        return text[:limit].rsplit(" ", 1)[0] + " ..."
+
+    return trim(first, first_limit), trim(second, second_limit)
+
+class HybridQueryBuilder:
+    """Request parameters for /query/, shared by the sync and async HybridSearch clients.
+
+    Subclasses provide the synthesis_supported flag.
+    """
+
+    def _build_query_params(self, params: Dict[str, Any]) -> List[Tuple[str, Any]]:
+        # Properly handle list of doc_ids
+        query_params = []
+        for key, value in params.items():
+            if isinstance(value, list):
+                for item in value:
+                    query_params.append((key, item))
+            else:
+                query_params.append((key, value))
+        return query_params
+
+    def _documents_params(self, query: str, doc_ids: List[str] = None) -> Dict[str, Any]:
+        return {
             "query": query,
             "search_type": "documents",
             "doc_ids": doc_ids or [],
             "top_k_docs": 7,
             "prompt_instructions": "Focus strictly on factual information from company documents."
         }
-        return self._query_source(params)
 
-    def query_web(self, query: str, domain: str = None) -> str:
-        params = {
+    def _web_params(self, query: str, domain: str = None) -> Dict[str, Any]:
+        return {
             "query": query,
             "search_type": "domain" if domain else "web",
             "target_domain": domain,
             "top_k_web": 5,
             "prompt_instructions": "Include latest market trends and competitive landscape."
         }
-        return self._query_source(params)
 
-    def hybrid_search(self, document_query: str, web_query: str, doc_ids: List[str] = None, domain: str = None) -> str:
-        doc_results = self.query_documents(document_query, doc_ids)
-        web_results = self.query_web(web_query, domain)
+    def _web_request(
+        self, query: str, domain: str = None, company: str = None, sector: str = None
+    ) -> Tuple[Dict[str, Any], Optional[float]]:
+        """Web params for a prompt and the cache age they may be reused at.
 
-        return self._synthesize_results(doc_results, web_results)
+        With a company and its sector, sector-level prompts are asked for the sector so the
+        answer is shared across it; other prompts are asked for the company.
+        """
+        if company:
+            if sector and not domain and is_sector_level(query):
+                return self._web_params(f"{query} for the {sector} sector"), SECTOR_FRESHNESS
+            query = f"{query} for {company}"
+        return self._web_params(query, domain), None
 
-    def _synthesize_results(self, doc_results, web_results):
+    def _synthesis_params(self, doc_results: str, web_results: str) -> Dict[str, Any]:
+        # Both answers are trimmed to the shared token budget
+        doc_text, web_text = _trim_pair(doc_results, web_results, SYNTHESIS_TOKEN_BUDGET * CHARS_PER_TOKEN)
         synthesis_prompt = f"""
         Combine and summarize insights from these two sources into a single paragraph:
         
         Company Documents:
-        {doc_results}
+        {doc_text}
         
         Web Research:
-        {web_results}
+        {web_text}
         
         Create a comprehensive answer that highlights:
         1. Key facts from official documents
@@ -291,24 +483,529 @@ class HybridSearch:
 
         
         """
-        
-        return self._query_source({
+
+        if self.synthesis_supported:
+            # Dedicated mode: the server answers from the supplied text without any retrieval
+            return {
+                "query": synthesis_prompt,
+                "search_type": "synthesis",
+                "prompt_instructions": "Synthesize key points without speculation"
+            }
+        return {
             "query": synthesis_prompt,
             "search_type": "web",
-            "top_k_web": 5,
+            "top_k_web": 0,
             "prompt_instructions": "Synthesize key points without speculation"
-        })
+        }
+
+    def _synthesis_rejected(self, status: Optional[int]) -> bool:
+        """True, and synthesis mode is switched off, if status means the server lacks search_type=synthesis"""
+        if status not in SYNTHESIS_UNSUPPORTED_STATUSES:
+            return False
+        if self.synthesis_supported:
+            print("Synthesis mode not supported by the server, falling back to a retrieval-free web query")
+            self.synthesis_supported = False
+        return True
 
-def retrieve_company_documents(company_name):
+    def _combine_on_client(self, doc_results: str, web_results: str) -> str:
+        """Both legs answered but the server cannot synthesize: return the two answers side by side"""
+        return f"From company documents:\n{doc_results}\n\nFrom web research:\n{web_results}"
+
+    def _merge_on_client(self, doc_results: str, web_results: str) -> Optional[str]:
+        """Skip the synthesis call when one leg is empty or failed; returns None when a merge is needed"""
+        has_doc = bool(doc_results.strip())
+        has_web = bool(web_results.strip())
+        if has_doc and has_web:
+            return None
+        if has_doc:
+            return doc_results
+        return web_results if has_web else ""
+
+class HybridSearch(HybridQueryBuilder):
+    def __init__(
+        self,
+        api_base: str = API_BASE,
+        session: requests.Session = None,
+        cache: ResponseCache = None,
+        use_cache: bool = True,
+        metrics: Metrics = None
+    ):
+        self.api_base = api_base
+        self.session = session or get_session()
+        self.cache = cache if cache is not None else get_response_cache()
+        self.use_cache = use_cache
+        self.metrics = metrics or global_metrics
+        self.default_headers = {"Accept": "application/json"}
+        # Flipped off the first time the server turns out to lack /query/batch
+        self.batch_supported = True
+        # Flipped off the first time the server rejects search_type=synthesis
+        self.synthesis_supported = True
+        
+    def _query_source(
+        self, params: Dict[str, Any], raise_http_errors: bool = False, max_age: Optional[float] = None
+    ) -> str:
+        search_type = params.get('search_type', 'unknown')
+        started = time.perf_counter()
+        if self.use_cache:
+            cached = self.cache.get(params, max_age)
+            if cached is not None:
+                record_call("query", search_type, started, cache_hit=True, collector=self.metrics)
+                return extract_content(cached)
+
+        response = None
+        try:
+            response = self.session.get(
+                f"{self.api_base}/query/",
+                params=self._build_query_params(params),
+                headers=self.default_headers
+            )
+            response.raise_for_status()
+            # Only the answer text is kept; raw payloads (sources, scores...) are dropped here
+            result = extract_content(response.json())
+            record_call("query", search_type, started, response, collector=self.metrics)
+            if self.use_cache and result:
+                self.cache.set(params, {"content": result})
+            return result
+        except requests.exceptions.HTTPError as e:
+            record_call("query", search_type, started, response, error=error_class(e), collector=self.metrics)
+            if raise_http_errors:
+                raise
+            print(f"Error querying {search_type}: {str(e)}")
+            return ""
+        except Exception as e:
+            record_call("query", search_type, started, response, error=error_class(e), collector=self.metrics)
+            print(f"Unexpected error: {str(e)}")
+            return ""
+
+    def _fan_out(self, params_list: List[Dict[str, Any]]) -> List[str]:
+        with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_QUERIES) as executor:
+            return list(executor.map(self._query_source, params_list))
+
+    def _post_batch(self, params_list: List[Dict[str, Any]]) -> List[str]:
+        # Fields identical across the batch (doc_ids, instructions, top_k...) are sent once
+        shared = {
+            key: value for key, value in params_list[0].items()
+            if key != "query" and all(params.get(key) == value for params in params_list)
+        }
+        queries = [{k: v for k, v in params.items() if k not in shared} for params in params_list]
+
+        started = time.perf_counter()
+        response = self.session.post(
+            f"{self.api_base}/query/batch",
+            json={"shared": shared, "queries": queries},
+            headers=self.default_headers
+        )
+        record_call(
+            "query", "batch", started, response,
+            error=None if response.ok else f"http_{response.status_code}", collector=self.metrics
+        )
+        if response.status_code in (404, 405, 501):
+            print("Batch query route not available, falling back to individual queries")
+            self.batch_supported = False
+            return self._fan_out(params_list)
+        response.raise_for_status()
+
+        data = response.json()
+        results = data.get("results", []) if isinstance(data, dict) else data
+        if len(results) != len(params_list):
+            raise ValueError(f"Batch returned {len(results)} results for {len(params_list)} queries")
+        return [extract_content(result) for result in results]
+
+    def _query_batch_source(
+        self, params_list: List[Dict[str, Any]], max_ages: List[Optional[float]] = None
+    ) -> List[str]:
+        """Batched _query_source: answers are aligned with params_list"""
+        results = [None] * len(params_list)
+        max_ages = max_ages or [None] * len(params_list)
+        pending = []
+        for i, (params, max_age) in enumerate(zip(params_list, max_ages)):
+            cached = self.cache.get(params, max_age) if self.use_cache else None
+            if cached is not None:
+                results[i] = extract_content(cached)
+            else:
+                pending.append(i)
+
+        for start in range(0, len(pending), QUERY_BATCH_SIZE):
+            chunk = pending[start:start + QUERY_BATCH_SIZE]
+            chunk_params = [params_list[i] for i in chunk]
+
+            if not self.batch_supported:
+                answers = self._fan_out(chunk_params)
+            else:
+                try:
+                    answers = self._post_batch(chunk_params)
+                except Exception as e:
+                    print(f"Batch query failed, retrying individually: {str(e)}")
+                    answers = self._fan_out(chunk_params)
+
+            for i, params, answer in zip(chunk, chunk_params, answers):
+                results[i] = answer or ""
+                if self.use_cache and answer:
+                    self.cache.set(params, {"content": answer})
+        return results
+
+    def _stream_source(
+        self, params: Dict[str, Any], max_age: Optional[float] = None, raise_http_errors: bool = False
+    ) -> Iterator[str]:
+        """Yield answer text from /query/ as it is generated (SSE, chunked text, or plain JSON).
+
+        Returns True if the answer arrived in full, False if the request or the stream failed.
+        """
+        label = f"{params.get('search_type', 'unknown')}_stream"
+        started = time.perf_counter()
+        if self.use_cache:
+            cached = self.cache.get(params, max_age)
+            if cached is not None:
+                record_call("query", label, started, cache_hit=True, collector=self.metrics)
+                yield extract_content(cached)
+                return True
+
+        chunks = []
+        response = None
+        error = None
+        try:
+            response = self.session.get(
+                f"{self.api_base}/query/",
+                params=self._build_query_params({**params, "stream": "true"}),
+                headers={"Accept": "text/event-stream, application/json"},
+                stream=True
+            )
+            response.raise_for_status()
+            content_type = response.headers.get("Content-Type", "")
+
+            if "application/json" in content_type:
+                # Server without streaming support: the whole answer arrives at once
+                chunks.append(extract_content(response.json()))
+                yield chunks[-1]
+            elif "text/event-stream" in content_type:
+                for line in response.iter_lines(decode_unicode=True):
+                    if not line or not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    try:
+                        event = json.loads(data)
+                    except ValueError:
+                        event = data
+                    if isinstance(event, dict):
+                        token = event.get("delta") or event.get("token") or event.get("content") or ""
+                    else:
+                        token = str(event)
+                    if token:
+                        chunks.append(token)
+                        yield token
+            else:
+                response.encoding = response.encoding or "utf-8"
+                for token in response.iter_content(chunk_size=None, decode_unicode=True):
+                    if token:
+                        chunks.append(token)
+                        yield token
+        except requests.exceptions.HTTPError as e:
+            error = error_class(e)
+            if raise_http_errors:
+                record_call("query", label, started, response, response_bytes=0, error=error, collector=self.metrics)
+                raise
+            print(f"Error streaming {params.get('search_type', 'unknown')}: {str(e)}")
+        except Exception as e:
+            error = error_class(e)
+            print(f"Unexpected error: {str(e)}")
+        finally:
+            if response is not None:
+                # Frees the backend slot when the stream ends early ([DONE], errors, consumer stopped)
+                response.close()
+
+        record_call(
+            "query", label, started, response,
+            response_bytes=sum(len(chunk.encode("utf-8")) for chunk in chunks), error=error, collector=self.metrics
+        )
+
+        # A stream that broke partway must not be reused as the answer
+        complete = error is None
+        if self.use_cache and chunks and complete:
+            self.cache.set(params, {"content": "".join(chunks)})
+        return complete
+
+    def query_documents(self, query: str, doc_ids: List[str] = None) -> str:
+        return self._query_source(self._documents_params(query, doc_ids))
+
+    def _single_flight(self, params: Dict[str, Any], max_age: Optional[float] = None):
+        """_query_source that lets concurrent identical queries share one backend call"""
+        key = cache_key(params)
+        with _inflight_lock:
+            future = _inflight_queries.get(key)
+            leader = future is None
+            if leader:
+                future = _inflight_queries[key] = Future()
+
+        if not leader:
+            started = time.perf_counter()
+            result = future.result()
+            record_call("query", f"{params.get('search_type', 'unknown')}_shared", started, cache_hit=True, collector=self.metrics)
+            return result
+
+        result = ""
+        try:
+            result = self._query_source(params, max_age=max_age)
+        finally:
+            future.set_result(result)
+            with _inflight_lock:
+                _inflight_queries.pop(key, None)
+        return result
+
+    def query_web(self, query: str, domain: str = None, company: str = None, sector: str = None) -> str:
+        """Web answer for a query; with a company, the query is scoped to it or to its sector"""
+        return self._single_flight(*self._web_request(query, domain, company, sector))
+
+    def _timed(self, func, *args):
+        start = time.perf_counter()
+        result = func(*args)
+        return result, time.perf_counter() - start
+
+    def _run_legs(
+        self,
+        document_query: str,
+        web_query: str,
+        doc_ids: List[str] = None,
+        domain: str = None,
+        company: str = None,
+        timings: Dict[str, float] = None,
+        sector: str = None
+    ):
+        # The document and web legs are independent, so run them side by side
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            doc_future = executor.submit(self._timed, self.query_documents, document_query, doc_ids)
+            web_future = executor.submit(self._timed, self.query_web, web_query, domain, company, sector)
+            (doc_results, doc_time), (web_results, web_time) = doc_future.result(), web_future.result()
+        if timings is not None:
+            timings.update(documents=round(doc_time, 3), web=round(web_time, 3))
+        return doc_results, web_results
+
+    def hybrid_search(
+        self,
+        document_query: str,
+        web_query: str,
+        doc_ids: List[str] = None,
+        domain: str = None,
+        company: str = None,
+        timings: Dict[str, float] = None,
+        sector: str = None
+    ) -> str:
+        """Synthesized answer; seconds per leg and for synthesis are stored in timings when given"""
+        doc_results, web_results = self._run_legs(document_query, web_query, doc_ids, domain, company, timings, sector)
+        result, synthesis_time = self._timed(self._synthesize_results, doc_results, web_results)
+        if timings is not None:
+            timings["synthesis"] = round(synthesis_time, 3)
+        return result
+
+    def _synthesize_results(self, doc_results: str, web_results: str) -> str:
+        merged = self._merge_on_client(doc_results, web_results)
+        if merged is not None:
+            return merged
+
+        if self.synthesis_supported:
+            try:
+                # A transient failure comes back as "" so that the prompt is retried, not answered with raw legs
+                return self._query_source(self._synthesis_params(doc_results, web_results), raise_http_errors=True)
+            except requests.exceptions.HTTPError as e:
+                if not self._synthesis_rejected(e.response.status_code if e.response is not None else None):
+                    return ""
+        # Synthesis mode is unsupported: only then is merging on the client an acceptable answer
+        result = self._query_source(self._synthesis_params(doc_results, web_results))
+        return result or self._combine_on_client(doc_results, web_results)
+
+    def _stream_synthesis(self, doc_results: str, web_results: str) -> Iterator[str]:
+        """Streaming _synthesize_results, with the same unsupported-mode and client-side fallbacks.
+
+        Returns False without yielding when synthesis failed transiently, so the answer is not reused.
+        """
+        streamed = False
+        complete = False
+        try:
+            params = self._synthesis_params(doc_results, web_results)
+            tokens = self._stream_source(params, raise_http_errors=self.synthesis_supported)
+            while True:
+                try:
+                    token = next(tokens)
+                except StopIteration as stop:
+                    complete = stop.value
+                    break
+                streamed = True
+                yield token
+        except requests.exceptions.HTTPError as e:
+            if self._synthesis_rejected(e.response.status_code if e.response is not None else None):
+                # synthesis_supported is now False, so this streams the retrieval-free web query
+                return (yield from self._stream_synthesis(doc_results, web_results))
+        if not streamed:
+            if self.synthesis_supported:
+                return False
+            yield self._combine_on_client(doc_results, web_results)
+            return True
+        return complete
+
+    def stream_prompt(
+        self,
+        prompt: str,
+        mode: str,
+        doc_ids: List[str] = None,
+        company: str = "",
+        timings: Dict[str, float] = None,
+        sector: str = None
+    ) -> Iterator[str]:
+        """Streaming counterpart of run_prompt, yielding answer text as it arrives.
+
+        The generator returns True if the answer is complete (see stream_outcome).
+        """
+        timings = {} if timings is None else timings
+        started = time.perf_counter()
+        if mode == "Documents Only":
+            complete = yield from self._stream_source(self._documents_params(prompt, doc_ids))
+            timings["documents"] = round(time.perf_counter() - started, 3)
+            return complete
+        if mode == "Web Only":
+            complete = yield from self._stream_source(*self._web_request(prompt, company=company, sector=sector))
+            timings["web"] = round(time.perf_counter() - started, 3)
+            return complete
+        # Both legs must finish before synthesis can start; only the synthesis is streamed
+        doc_results, web_results = self._run_legs(prompt, prompt, doc_ids, company=company, timings=timings, sector=sector)
+        started = time.perf_counter()
+        merged = self._merge_on_client(doc_results, web_results)
+        if merged is not None:
+            yield merged
+            complete = True
+        else:
+            complete = yield from self._stream_synthesis(doc_results, web_results)
+        timings["synthesis"] = round(time.perf_counter() - started, 3)
+        return complete
+
+    def run_prompt(
+        self,
+        prompt: str,
+        mode: str,
+        doc_ids: List[str] = None,
+        company: str = "",
+        timings: Dict[str, float] = None,
+        sector: str = None
+    ) -> str:
+        """Run a single prompt in one of the SEARCH_MODES; seconds per leg are stored in timings when given.
+
+        sector is the company's sector, if known; sector-level prompts are then asked once for it.
+        """
+        if mode == "Documents Only":
+            leg, (result, seconds) = "documents", self._timed(self.query_documents, prompt, doc_ids)
+        elif mode == "Web Only":
+            leg, (result, seconds) = "web", self._timed(self.query_web, prompt, None, company, sector)
+        else:
+            return self.hybrid_search(prompt, prompt, doc_ids, company=company, timings=timings, sector=sector)
+        if timings is not None:
+            timings[leg] = round(seconds, 3)
+        return result
+
+    def query_batch(
+        self, prompts: List[str], mode: str, doc_ids: List[str] = None, company: str = "", sector: str = None
+    ) -> List[str]:
+        """Run prompts sharing one mode as batched requests, returning answers in input order"""
+        if not prompts:
+            return []
+        if mode == "Documents Only":
+            return self._query_batch_source([self._documents_params(p, doc_ids) for p in prompts])
+        web_params, web_max_ages = zip(*[self._web_request(p, company=company, sector=sector) for p in prompts])
+        if mode == "Web Only":
+            return self._query_batch_source(list(web_params), list(web_max_ages))
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            doc_future = executor.submit(self._query_batch_source, [self._documents_params(p, doc_ids) for p in prompts])
+            web_future = executor.submit(self._query_batch_source, list(web_params), list(web_max_ages))
+            doc_results, web_results = doc_future.result(), web_future.result()
+
+        results = [self._merge_on_client(doc, web) for doc, web in zip(doc_results, web_results)]
+        needs_synthesis = [i for i, result in enumerate(results) if result is None]
+        synthesized = self._query_batch_source([
+            self._synthesis_params(doc_results[i], web_results[i]) for i in needs_synthesis
+        ])
+        # Batched errors are swallowed, so failed syntheses are redone one at a time; that detects
+        # an unsupported synthesis mode, while transient failures stay empty and are retried by the caller
+        failed = [i for i, result in zip(needs_synthesis, synthesized) if not result]
+        with ThreadPoolExecutor(max_workers=max(1, min(len(failed), MAX_CONCURRENT_QUERIES))) as executor:
+            retried = executor.map(lambda i: self._synthesize_results(doc_results[i], web_results[i]), failed)
+            synthesized = dict(zip(needs_synthesis, synthesized))
+            synthesized.update(zip(failed, retried))
+        for i in needs_synthesis:
+            results[i] = synthesized[i]
+        return results
+
+    def run_batch(
+        self,
+        prompts: List[str],
+        mode: str,
+        doc_ids: List[str] = None,
+        company: str = "",
+        max_workers: int = MAX_CONCURRENT_QUERIES,
+        sector: str = None
+    ) -> Iterator[Tuple[int, str, str, float]]:
+        """Run prompts concurrently, yielding (index, prompt, answer, seconds) in completion order"""
+        executor = ThreadPoolExecutor(max_workers=max(1, max_workers))
+        run_prompt = partial(self.run_prompt, sector=sector)
+        try:
+            futures = {
+                executor.submit(self._timed, run_prompt, prompt, mode, doc_ids, company): (i, prompt)
+                for i, prompt in enumerate(prompts)
+            }
+            for future in as_completed(futures):
+                i, prompt = futures[future]
+                response, elapsed = future.result()
+                yield i, prompt, response, elapsed
+        finally:
+            # Drop queued prompts if the caller stops consuming early
+            executor.shutdown(wait=True, cancel_futures=True)
+
+# Document sources fetched for a new company, in display order
+DOCUMENT_SOURCES = {
+    "sec_10k": download_sec_10k,
+    "web_report": download_web_annual_report
+}
+
+def acquire_company_documents(company_name, progress=None) -> Iterator[Tuple[str, str, str]]:
+    """Download all sources concurrently and upload each file as soon as it is ready.
+
+    Yields (report_type, path, doc_id) as each source finishes; path and doc_id are None on failure.
+    progress(report_type, sent, total) reports upload progress from the worker threads.
+    """
+    executor = ThreadPoolExecutor(max_workers=2 * len(DOCUMENT_SOURCES))
+    try:
+        downloads = {
+            executor.submit(download, company_name): report_type
+            for report_type, download in DOCUMENT_SOURCES.items()
+        }
+        uploads = {}
+        for future in as_completed(downloads):
+            report_type = downloads[future]
+            try:
+                path = future.result()
+            except Exception as e:
+                print(f"{report_type} download failed: {str(e)}")
+                path = None
+            if path and verify_document(path):
+                upload_progress = partial(progress, report_type) if progress else None
+                uploads[executor.submit(upload_and_get_doc_id, path, upload_progress)] = (report_type, path)
+            else:
+                yield report_type, None, None
+
+        for future in as_completed(uploads):
+            report_type, path = uploads[future]
+            yield report_type, path, future.result()
+    finally:
+        executor.shutdown(wait=True)
+
+def retrieve_company_documents(company_name, acquire: bool = True):
     """Retrieve documents for a company, checking existing ones first"""
     print(f"\n{'='*40}")
     print(f"Retrieving documents for {company_name}")
     print(f"{'='*40}\n")
     
-    # Get existing documents
+    # Look up existing documents in the locally synced index
     print("Checking for existing company documents...")
-    existing_docs = get_existing_documents()
-    company_docs = find_company_documents(company_name, existing_docs)
+    company_docs = get_document_index(fetch_documents).find(company_name)
     
     if company_docs:
         print(f"Found {len(company_docs)} existing documents for {company_name}:")
@@ -318,29 +1015,19 @@ def retrieve_company_documents(company_name):
         # Return the doc_ids of existing documents
         return [doc["doc_id"] for doc in company_docs]
     
+    if not acquire:
+        return []
+
     print("No existing documents found. Retrieving new documents...")
+    print("\n=== Fetching SEC 10-K and web annual report in parallel ===\n")
     
-    # Download new documents
-    results = {
-        'sec_10k': None,
-        'web_report': None
-    }
-    
-    # Download SEC 10-K filing
-    print("\n=== 1. Checking SEC EDGAR database for 10-K ===\n")
-    results['sec_10k'] = download_sec_10k(company_name)
-    
-    # Download annual report from company website
-    print("\n=== 2. Searching web for annual report PDF ===\n")
-    results['web_report'] = download_web_annual_report(company_name)
-    
-    # Upload documents and collect doc_ids
+    # Download new documents and upload each one as soon as it lands
+    results = {report_type: None for report_type in DOCUMENT_SOURCES}
     doc_ids = []
-    for report_type, report_path in results.items():
-        if report_path:
-            doc_id = upload_and_get_doc_id(report_path)
-            if doc_id:
-                doc_ids.append(doc_id)
+    for report_type, report_path, doc_id in acquire_company_documents(company_name):
+        results[report_type] = report_path
+        if doc_id:
+            doc_ids.append(doc_id)
     
     # Print summary
     print("\n=== Document Retrieval Results ===")
@@ -369,8 +1056,8 @@ ANALYSIS_QUESTIONS = [
     }
 ]
 
-def analyze_company_with_preset_questions(company_name: str):
-    """Analyze a company using the preset questions"""
+def analyze_company_with_preset_questions(company_name: str, reuse: bool = True):
+    """Analyze a company using the preset questions, reusing answers whose inputs are unchanged"""
     # First, retrieve and manage company documents
     doc_ids = retrieve_company_documents(company_name)
     
@@ -380,6 +1067,7 @@ def analyze_company_with_preset_questions(company_name: str):
     
     # Initialize search tool
     search_tool = HybridSearch()
+    manifest = RunManifest(company_name)
     
     # Process each question
     results = {}
@@ -392,6 +1080,13 @@ def analyze_company_with_preset_questions(company_name: str):
         if web_domain:
             print(f"Using domain: {web_domain}")
         print(f"{'='*40}\n")
+
+        previous = manifest.get(question, "Hybrid", doc_ids, web_domain) if reuse else None
+        if previous is not None:
+            results[question] = previous
+            print(f"\nAnalysis for Question {i} (unchanged, reused):")
+            print(previous)
+            continue
         
         # Run hybrid search for this question
         result = search_tool.hybrid_search(
@@ -402,9 +1097,11 @@ def analyze_company_with_preset_questions(company_name: str):
         )
         
         results[question] = result
+        manifest.record("Preset Questions", question, "Hybrid", doc_ids, result, web_domain)
         print(f"\nAnalysis for Question {i}:")
         print(result)
     
+    manifest.save()
     return results
 
 def interactive_company_analysis():
@@ -0,0 +1,435 @@
+"""asyncio client for the document database and SEC, mirroring app.HybridSearch.
+
+Hundreds of queries can be in flight from one event loop instead of one thread each:
+
+    async with AsyncHybridSearch() as search:
+        async for i, prompt, response, seconds in search.run_batch(prompts, "Hybrid", doc_ids, "Apple Inc"):
+            ...
+"""
+import asyncio
+import os
+import time
+import weakref
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import httpx
+
+from app import (
+    API_BASE,
+    SEC_HEADERS,
+    UPLOAD_TIMEOUT,
+    HybridQueryBuilder,
+    extract_content,
+    fetch_documents,
+    get_cik_from_name,
+    latest_10k_url_from_submissions,
+    save_10k
+)
+from cache import ResponseCache, cache_key, get_response_cache
+from doc_index import get_document_index
+from limiter import OVERLOAD_STATUSES, backend_for_host
+from metrics import Metrics, error_class, metrics as global_metrics, record_call
+from transport import DEFAULT_TIMEOUT, HOST_LIMITS, RATE_LIMITS, RETRY_BACKOFF, RETRY_STATUSES, RETRY_TOTAL, match_suffix
+from uploads import file_sha256, get_upload_index
+
+# Requests in flight at once across everything sharing a controller
+MAX_IN_FLIGHT = 256
+
+# Connections kept open per client
+MAX_CONNECTIONS = 100
+
+# Only idempotent requests are retried on RETRY_STATUSES, as with the sync PooledSession
+RETRY_METHODS = ("GET", "HEAD")
+
+
+class ConcurrencyController:
+    """Semaphores bounding requests in flight overall and per host, plus per-domain request rates"""
+
+    def __init__(self, max_in_flight: int = MAX_IN_FLIGHT, host_limits: Dict[str, int] = None,
+                 rate_limits: Dict[str, float] = None):
+        host_limits = HOST_LIMITS if host_limits is None else host_limits
+        rate_limits = RATE_LIMITS if rate_limits is None else rate_limits
+        self.in_flight = asyncio.Semaphore(max_in_flight)
+        self.host_semaphores = {suffix: asyncio.Semaphore(limit) for suffix, limit in host_limits.items()}
+        self.intervals = {suffix: 1.0 / rate for suffix, rate in rate_limits.items()}
+        self.next_slot = {suffix: 0.0 for suffix in rate_limits}
+
+    async def _pace(self, suffix: str):
+        # No await between reading and advancing next_slot, so no lock is needed on one loop
+        now = asyncio.get_running_loop().time()
+        wait = self.next_slot[suffix] - now
+        self.next_slot[suffix] = max(now, self.next_slot[suffix]) + self.intervals[suffix]
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    @asynccontextmanager
+    async def slot(self, url: str):
+        """Wait for the rate limit and a free slot before sending a request to url"""
+        host = urlparse(url).hostname or ""
+        suffix = match_suffix(host, self.intervals)
+        if suffix:
+            await self._pace(suffix)
+
+        host_semaphore = self.host_semaphores.get(match_suffix(host, self.host_semaphores))
+        async with self.in_flight:
+            if host_semaphore is None:
+                yield
+            else:
+                async with host_semaphore:
+                    yield
+
+
+# One controller per event loop; asyncio primitives cannot be shared between loops
+_controllers: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, ConcurrencyController]" = weakref.WeakKeyDictionary()
+
+
+def get_controller() -> ConcurrencyController:
+    """Return the controller shared by everything running on the current event loop"""
+    loop = asyncio.get_running_loop()
+    controller = _controllers.get(loop)
+    if controller is None:
+        controller = _controllers[loop] = ConcurrencyController()
+    return controller
+
+
+def new_client(max_connections: int = MAX_CONNECTIONS) -> httpx.AsyncClient:
+    """AsyncClient with keep-alive pooling, the default timeouts and connect retries"""
+    connect, read = DEFAULT_TIMEOUT
+    limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(read, connect=connect),
+        transport=httpx.AsyncHTTPTransport(retries=RETRY_TOTAL, limits=limits),
+        follow_redirects=True
+    )
+
+
+@asynccontextmanager
+async def _client_scope(client: Optional[httpx.AsyncClient]):
+    if client is not None:
+        yield client
+    else:
+        async with new_client() as own_client:
+            yield own_client
+
+
+async def send(client: httpx.AsyncClient, controller: ConcurrencyController, method: str, url: str,
+               **kwargs) -> httpx.Response:
+    """Send a request within the controller's limits, retrying throttling and server errors with backoff.
+
+    Shares the thread-side circuit breaker for the backend, so both clients fail fast while
+    it is down. The response carries retry_count for instrumentation.
+    """
+    backend = backend_for_host(urlparse(url).hostname or "")
+    if backend is not None:
+        backend.breaker.check()
+
+    # The breaker only sees the final outcome, so a request that succeeds after a retry counts as healthy
+    retries = RETRY_TOTAL if method in RETRY_METHODS else 0
+    try:
+        for attempt in range(retries + 1):
+            async with controller.slot(url):
+                response = await client.request(method, url, **kwargs)
+            if response.status_code not in RETRY_STATUSES or attempt == retries:
+                response.retry_count = attempt
+                if backend is not None:
+                    backend.breaker.record(response.status_code not in OVERLOAD_STATUSES)
+                return response
+            retry_after = response.headers.get("Retry-After", "")
+            await asyncio.sleep(float(retry_after) if retry_after.isdigit() else RETRY_BACKOFF * 2 ** attempt)
+    except Exception:
+        if backend is not None:
+            backend.breaker.record(False)
+        raise
+    except BaseException:
+        # Cancelled (e.g. run_batch stopped early): no outcome, but a half-open probe must be released
+        if backend is not None:
+            backend.breaker.abandon()
+        raise
+
+
+class AsyncHybridSearch(HybridQueryBuilder):
+    """asyncio counterpart of app.HybridSearch: query_documents, query_web, hybrid_search, run_prompt, run_batch"""
+
+    def __init__(
+        self,
+        api_base: str = API_BASE,
+        client: httpx.AsyncClient = None,
+        controller: ConcurrencyController = None,
+        cache: ResponseCache = None,
+        use_cache: bool = True,
+        metrics: Metrics = None
+    ):
+        self.api_base = api_base
+        self.client = client
+        self.owns_client = client is None
+        self.controller = controller
+        self.cache = cache if cache is not None else get_response_cache()
+        self.use_cache = use_cache
+        self.metrics = metrics or global_metrics
+        self.default_headers = {"Accept": "application/json"}
+        # Flipped off the first time the server rejects search_type=synthesis
+        self.synthesis_supported = True
+        # Web queries being fetched, so concurrent identical queries share one call
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    async def __aenter__(self) -> "AsyncHybridSearch":
+        self._ensure_client()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    def _ensure_client(self):
+        # Created lazily so that both belong to the running event loop
+        if self.client is None:
+            self.client = new_client()
+        if self.controller is None:
+            self.controller = get_controller()
+
+    async def aclose(self):
+        if self.owns_client and self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    async def _query_source(
+        self, params: Dict[str, Any], raise_http_errors: bool = False, max_age: Optional[float] = None
+    ) -> str:
+        search_type = params.get('search_type', 'unknown')
+        started = time.perf_counter()
+        if self.use_cache:
+            cached = self.cache.get(params, max_age)
+            if cached is not None:
+                record_call("query", search_type, started, cache_hit=True, collector=self.metrics)
+                return extract_content(cached)
+
+        self._ensure_client()
+        response = None
+        try:
+            response = await send(
+                self.client, self.controller, "GET", f"{self.api_base}/query/",
+                params=self._build_query_params(params), headers=self.default_headers
+            )
+            response.raise_for_status()
+            result = extract_content(response.json())
+            record_call("query", search_type, started, response, response_bytes=len(response.content),
+                        collector=self.metrics)
+            if self.use_cache and result:
+                self.cache.set(params, {"content": result})
+            return result
+        except httpx.HTTPStatusError as e:
+            record_call("query", search_type, started, response, response_bytes=0, error=error_class(e),
+                        collector=self.metrics)
+            if raise_http_errors:
+                raise
+            print(f"Error querying {search_type}: {str(e)}")
+            return ""
+        except Exception as e:
+            record_call("query", search_type, started, response, response_bytes=0, error=error_class(e),
+                        collector=self.metrics)
+            print(f"Unexpected error: {str(e)}")
+            return ""
+
+    async def _single_flight(self, params: Dict[str, Any], max_age: Optional[float] = None):
+        key = cache_key(params)
+        task = self._inflight.get(key)
+        leader = task is None
+        if leader:
+            task = asyncio.ensure_future(self._query_source(params, max_age=max_age))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+
+        started = time.perf_counter()
+        # Shielded so that one cancelled caller does not cancel the query for the others
+        result = await asyncio.shield(task)
+        if leader:
+            return result
+        record_call("query", f"{params.get('search_type', 'unknown')}_shared", started, cache_hit=True,
+                    collector=self.metrics)
+        return result
+
+    async def query_documents(self, query: str, doc_ids: List[str] = None) -> str:
+        return await self._query_source(self._documents_params(query, doc_ids))
+
+    async def query_web(self, query: str, domain: str = None, company: str = None, sector: str = None) -> str:
+        """Web answer for a query; with a company, the query is scoped to it or to its sector"""
+        return await self._single_flight(*self._web_request(query, domain, company, sector))
+
+    async def _timed(self, awaitable):
+        start = time.perf_counter()
+        result = await awaitable
+        return result, time.perf_counter() - start
+
+    async def hybrid_search(
+        self,
+        document_query: str,
+        web_query: str,
+        doc_ids: List[str] = None,
+        domain: str = None,
+        company: str = None,
+        timings: Dict[str, float] = None,
+        sector: str = None
+    ) -> str:
+        """Synthesized answer; seconds per leg and for synthesis are stored in timings when given"""
+        (doc_results, doc_time), (web_results, web_time) = await asyncio.gather(
+            self._timed(self.query_documents(document_query, doc_ids)),
+            self._timed(self.query_web(web_query, domain, company, sector))
+        )
+        result, synthesis_time = await self._timed(self._synthesize_results(doc_results, web_results))
+        if timings is not None:
+            timings.update(documents=round(doc_time, 3), web=round(web_time, 3), synthesis=round(synthesis_time, 3))
+        return result
+
+    async def _synthesize_results(self, doc_results: str, web_results: str) -> str:
+        merged = self._merge_on_client(doc_results, web_results)
+        if merged is not None:
+            return merged
+
+        if self.synthesis_supported:
+            try:
+                # A transient failure comes back as "" so that the prompt is retried, not answered with raw legs
+                params = self._synthesis_params(doc_results, web_results)
+                return await self._query_source(params, raise_http_errors=True)
+            except httpx.HTTPStatusError as e:
+                if not self._synthesis_rejected(e.response.status_code):
+                    return ""
+        # Synthesis mode is unsupported: only then is merging on the client an acceptable answer
+        result = await self._query_source(self._synthesis_params(doc_results, web_results))
+        return result or self._combine_on_client(doc_results, web_results)
+
+    async def run_prompt(
+        self,
+        prompt: str,
+        mode: str,
+        doc_ids: List[str] = None,
+        company: str = "",
+        timings: Dict[str, float] = None,
+        sector: str = None
+    ) -> str:
+        """Run a single prompt in one of the SEARCH_MODES; seconds per leg are stored in timings when given"""
+        if mode == "Documents Only":
+            leg, (result, seconds) = "documents", await self._timed(self.query_documents(prompt, doc_ids))
+        elif mode == "Web Only":
+            leg, (result, seconds) = "web", await self._timed(self.query_web(prompt, company=company, sector=sector))
+        else:
+            return await self.hybrid_search(prompt, prompt, doc_ids, company=company, timings=timings, sector=sector)
+        if timings is not None:
+            timings[leg] = round(seconds, 3)
+        return result
+
+    async def run_batch(
+        self,
+        prompts: List[str],
+        mode: str,
+        doc_ids: List[str] = None,
+        company: str = "",
+        max_concurrency: int = None,
+        sector: str = None
+    ) -> AsyncIterator[Tuple[int, str, str, float]]:
+        """Run prompts concurrently, yielding (index, prompt, answer, seconds) in completion order.
+
+        Requests are bounded by the controller; max_concurrency additionally caps prompts in flight.
+        """
+        limit = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+
+        async def run(i: int, prompt: str):
+            if limit is None:
+                response, elapsed = await self._timed(self.run_prompt(prompt, mode, doc_ids, company, sector=sector))
+            else:
+                async with limit:
+                    response, elapsed = await self._timed(self.run_prompt(prompt, mode, doc_ids, company, sector=sector))
+            return i, prompt, response, elapsed
+
+        tasks = [asyncio.ensure_future(run(i, prompt)) for i, prompt in enumerate(prompts)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # Drop outstanding prompts if the caller stops consuming early
+            for task in tasks:
+                task.cancel()
+
+
+async def upload_and_get_doc_id(file_path: str, client: httpx.AsyncClient = None,
+                                api_base: str = API_BASE) -> Optional[str]:
+    """Upload document and return doc_id; identical content already uploaded returns the existing doc_id"""
+    started = time.perf_counter()
+    response = None
+    try:
+        digest = await asyncio.to_thread(file_sha256, file_path)
+        uploads = get_upload_index()
+        doc_id = uploads.get(digest)
+        if doc_id:
+            if await asyncio.to_thread(get_document_index(fetch_documents).contains, doc_id):
+                record_call("upload", "upload", started, cache_hit=True)
+                print(f"Document {file_path} already uploaded (same content). doc_id: {doc_id}")
+                return doc_id
+            uploads.discard(digest)
+
+        # httpx streams file fields from disk in chunks rather than building the body in memory
+        async with _client_scope(client) as http:
+            with open(file_path, 'rb') as f:
+                response = await send(
+                    http, get_controller(), "POST", f"{api_base}/upload/",
+                    files={'file': f},
+                    headers={'Accept': 'application/json', 'X-Content-SHA256': digest},
+                    timeout=httpx.Timeout(UPLOAD_TIMEOUT[1], connect=UPLOAD_TIMEOUT[0])
+                )
+        response.raise_for_status()
+        record_call("upload", "upload", started, response, response_bytes=len(response.content))
+        data = response.json()
+        doc_id = data.get('doc_id')
+
+        if doc_id:
+            print(f"Document {file_path} uploaded and processed. doc_id: {doc_id}")
+            get_document_index(fetch_documents).add(doc_id, os.path.basename(file_path))
+            uploads.add(digest, doc_id, os.path.basename(file_path))
+            return doc_id
+        print(f"Upload response missing doc_id: {data}")
+        return None
+
+    except Exception as e:
+        record_call("upload", "upload", started, response, response_bytes=0, error=error_class(e))
+        print(f"Failed to upload {file_path}: {str(e)}")
+        return None
+
+
+async def get_latest_10k_url(cik: str, client: httpx.AsyncClient = None) -> Optional[str]:
+    url = f"https://data.sec.gov/submissions/CIK{cik}.json"
+    started = time.perf_counter()
+    async with _client_scope(client) as http:
+        response = await send(http, get_controller(), "GET", url, headers=SEC_HEADERS)
+    record_call("sec", "submissions", started, response, response_bytes=len(response.content),
+                error=None if response.is_success else f"http_{response.status_code}")
+    if not response.is_success:
+        print("Failed to get filings:", response.status_code)
+        return None
+    return latest_10k_url_from_submissions(cik, response.json())
+
+
+async def download_sec_10k(company_name: str, mode: str = None, client: httpx.AsyncClient = None) -> Optional[str]:
+    # The ticker index is local and refreshed at most daily, so the lookup runs in a worker thread
+    cik = await asyncio.to_thread(get_cik_from_name, company_name)
+    if not cik:
+        print("Company not found in SEC database.")
+        return None
+
+    print("Found CIK:", cik)
+    async with _client_scope(client) as http:
+        url = await get_latest_10k_url(cik, http)
+        if not url:
+            print("10-K filing not found.")
+            return None
+
+        print("Downloading 10-K HTML:", url)
+        started = time.perf_counter()
+        response = await send(http, get_controller(), "GET", url, headers=SEC_HEADERS)
+    record_call("sec", "10k_html", started, response, response_bytes=len(response.content),
+                error=None if response.is_success else f"http_{response.status_code}")
+    if not response.is_success:
+        print("Download failed:", response.status_code)
+        return None
+
+    # PDF rendering and section extraction block, so they run off the event loop
+    return await asyncio.to_thread(save_10k, company_name, response.text, url, mode)
@@ -0,0 +1,255 @@
+"""Headless multi-company SWOT runner.
+
+Runs every prompt of a prompt sheet for a list of companies across a shared worker
+pool and appends answers to the shared result store (optionally also writing the
+per-category Excel files). Progress is checkpointed after each answer, so re-running
+the same command resumes a crashed run; the checkpoint is deleted once every prompt
+has been answered.
+
+Example:
+    python batch_runner.py --companies-file watchlist.txt --prompts prompts.xlsx --mode Hybrid
+"""
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Tuple
+from urllib.parse import urlparse
+
+from app import API_BASE, SEARCH_MODES, HybridSearch, retrieve_company_documents
+from limiter import get_backend
+from outputs import write_category_results
+from prompt_catalog import DEFAULT_SHEET, PROMPT_SHEETS, load_catalog
+from result_store import get_result_store, new_run_id
+from transport import PooledSession
+
+CHECKPOINT_DIR = os.path.join(".cache", "batch_checkpoints")
+
+# Companies onboarded (document lookup / download) at the same time
+ONBOARD_WORKERS = 4
+
+# Times a prompt is tried while the document backend's circuit breaker is open
+PROMPT_ATTEMPTS = 3
+
+NO_RESPONSE = "No response returned."
+
+
+# (company, category, prompt, mode, doc_ids)
+CheckpointKey = Tuple[str, str, str, str, Tuple[str, ...]]
+
+
+def checkpoint_path(companies: List[str], rows: List[Tuple[str, str]], mode: str, sector: str = None) -> str:
+    """Checkpoint file of one invocation: the same companies, prompts, mode and sector resume it"""
+    payload = {"companies": sorted(companies), "rows": rows, "mode": mode, "sector": sector}
+    digest = hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(CHECKPOINT_DIR, f"{digest}.jsonl")
+
+
+class Checkpoint:
+    """Append-only JSONL log of finished (company, category, prompt, mode, doc_ids) answers of one run"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.done: Dict[CheckpointKey, str] = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # Partial line from a crash mid-write
+                    self.done[self._key(record)] = record["answer"]
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.file = open(path, "a", encoding="utf-8")
+
+    @staticmethod
+    def _key(record) -> CheckpointKey:
+        return record["company"], record["category"], record["prompt"], record["mode"], tuple(sorted(record.get("doc_ids", [])))
+
+    def get(self, company: str, category: str, prompt: str, mode: str, doc_ids: List[str]):
+        # Answers checkpointed against other documents are stale
+        return self.done.get((company, category, prompt, mode, tuple(sorted(doc_ids))))
+
+    def record(self, company: str, category: str, prompt: str, mode: str, doc_ids: List[str], answer: str):
+        record = {"company": company, "category": category, "prompt": prompt, "mode": mode, "doc_ids": doc_ids, "answer": answer}
+        with self.lock:
+            self.done[self._key(record)] = answer
+            self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+    def remove(self):
+        """Close and delete the checkpoint once its run has finished"""
+        self.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+def load_companies(args) -> List[str]:
+    companies = list(args.companies)
+    if args.companies_file:
+        with open(args.companies_file, encoding="utf-8") as f:
+            companies += [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    return list(dict.fromkeys(companies))
+
+
+def load_prompt_rows(path: str, categories: List[str] = None) -> List[Tuple[str, str]]:
+    catalog = load_catalog(path)
+    print(f"Prompt catalog {path} version {catalog.version}: {len(catalog)} prompts")
+    return catalog.select(categories or None)
+
+
+def onboard(companies: List[str], mode: str) -> Dict[str, List[str]]:
+    """Resolve doc_ids for every company, downloading documents for new ones"""
+    if mode == "Web Only":
+        return {company: [] for company in companies}
+
+    doc_ids = {}
+    with ThreadPoolExecutor(max_workers=ONBOARD_WORKERS) as executor:
+        futures = {executor.submit(retrieve_company_documents, company): company for company in companies}
+        for future in as_completed(futures):
+            company = futures[future]
+            try:
+                doc_ids[company] = future.result()
+            except Exception as e:
+                print(f"Failed to retrieve documents for {company}: {str(e)}")
+                doc_ids[company] = []
+    return doc_ids
+
+
+def write_company_outputs(company: str, rows: List[Tuple[str, str]], answers: List[str], mode: str, export_excel: bool):
+    if not export_excel:
+        return
+    by_category: Dict[str, List[Dict[str, str]]] = {}
+    for (category, prompt), answer in zip(rows, answers):
+        by_category.setdefault(category, []).append({"Prompt": prompt, "Response": answer, "Search Type": mode})
+    for category, results in by_category.items():
+        write_category_results(company, category, results)
+
+
+def run(args):
+    companies = load_companies(args)
+    rows = load_prompt_rows(args.prompts, args.categories)
+    if not companies or not rows:
+        print("Nothing to do: no companies or no prompts.")
+        return
+
+    api_host = urlparse(API_BASE).hostname
+    session = PooledSession(pool_maxsize=args.workers, host_limits={api_host: args.per_host})
+    search = HybridSearch(session=session, use_cache=not args.no_cache)
+    checkpoint = Checkpoint(args.checkpoint or checkpoint_path(companies, rows, args.mode, args.sector))
+
+    print(f"Onboarding {len(companies)} companies...")
+    doc_ids = onboard(companies, args.mode)
+
+    answers = {company: [None] * len(rows) for company in companies}
+    remaining = {company: len(rows) for company in companies}
+    lock = threading.Lock()
+
+    store = get_result_store()
+    run_id = new_run_id()
+
+    def answer_prompt(company: str, i: int) -> str:
+        category, prompt = rows[i]
+        backend = get_backend("api")
+        for attempt in range(PROMPT_ATTEMPTS):
+            started = time.perf_counter()
+            timings = {}
+            # Sector sweeps: market-level web answers are fetched once and shared by every company
+            answer = search.run_prompt(prompt, args.mode, doc_ids[company], company, timings, sector=args.sector)
+            latency = time.perf_counter() - started
+            if answer or backend.breaker.state == "closed":
+                break
+            # The backend is down rather than the prompt failing: wait for the breaker and try again
+            time.sleep(backend.breaker.retry_in() + 1)
+        if not answer:
+            # Not checkpointed, so the next run retries it
+            return NO_RESPONSE
+        checkpoint.record(company, category, prompt, args.mode, doc_ids[company], answer)
+        store.append(run_id, company, category, prompt, args.mode, answer, latency, doc_ids[company], i, timings)
+        return answer
+
+    # The checkpoint is only deleted when nothing is left for a re-run to retry
+    complete = True
+    try:
+        with ThreadPoolExecutor(max_workers=args.workers) as executor:
+            futures = {}
+            resumed = 0
+            for company in companies:
+                if args.mode != "Web Only" and not doc_ids[company]:
+                    print(f"Skipping {company}: no documents available")
+                    remaining.pop(company)
+                    complete = False
+                    continue
+                for i, (category, prompt) in enumerate(rows):
+                    previous = checkpoint.get(company, category, prompt, args.mode, doc_ids[company])
+                    if previous is not None:
+                        answers[company][i] = previous
+                        remaining[company] -= 1
+                        resumed += 1
+                        # Keep this run complete in the result store; no latency was measured
+                        store.append(run_id, company, category, prompt, args.mode, previous, None, doc_ids[company], i)
+                    else:
+                        futures[executor.submit(answer_prompt, company, i)] = (company, i)
+
+            # Companies fully answered by the checkpoint only need their files rewritten
+            for company, count in list(remaining.items()):
+                if count == 0:
+                    write_company_outputs(company, rows, answers[company], args.mode, args.export_excel)
+
+            total = len(futures)
+            print(f"Running {total} prompts ({resumed} resumed from checkpoint)")
+            for done, future in enumerate(as_completed(futures), 1):
+                company, i = futures[future]
+                try:
+                    answers[company][i] = future.result()
+                except Exception as e:
+                    print(f"Prompt failed for {company}: {str(e)}")
+                    answers[company][i] = NO_RESPONSE
+                if answers[company][i] == NO_RESPONSE:
+                    complete = False
+
+                with lock:
+                    remaining[company] -= 1
+                    finished = remaining[company] == 0
+                if finished:
+                    write_company_outputs(company, rows, answers[company], args.mode, args.export_excel)
+                    print(f"[{done}/{total}] Finished {company}")
+    except BaseException:
+        checkpoint.close()
+        raise
+    if complete:
+        checkpoint.remove()
+    else:
+        checkpoint.close()
+        print(f"Some prompts failed; re-run the same command to retry them (progress kept in {checkpoint.path})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run SWOT prompts for many companies without the UI")
+    parser.add_argument("companies", nargs="*", help="Company names")
+    parser.add_argument("--companies-file", help="File with one company name per line")
+    parser.add_argument("--prompts", default=DEFAULT_SHEET, help=f"Prompt sheet ({' or '.join(PROMPT_SHEETS.values())})")
+    parser.add_argument("--categories", nargs="*", help="Only run these categories")
+    parser.add_argument("--sector", help="Sector shared by all companies; market-level web prompts are asked once for it")
+    parser.add_argument("--mode", choices=SEARCH_MODES, default="Hybrid")
+    parser.add_argument("--workers", type=int, default=16, help="Global number of prompts in flight")
+    parser.add_argument("--per-host", type=int, default=8, help="Maximum in-flight requests to the API host")
+    parser.add_argument(
+        "--checkpoint", help=f"Progress file used to resume runs (default: one per invocation under {CHECKPOINT_DIR})"
+    )
+    parser.add_argument("--export-excel", action="store_true", help="Also write per-category Excel files under companies/")
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the response cache")
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
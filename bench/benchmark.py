@@ -0,0 +1,212 @@
+"""Throughput benchmark for HybridSearch and uploads against the mock API (or a real one).
+
+Drives Documents/Web/Hybrid runs over the prompt sheet at several concurrency levels,
+reports throughput, tail latency and memory, saves results under bench/results/ and
+compares them with the previous saved run.
+
+Example:
+    python bench/benchmark.py --limit 40 --concurrency 1 4 16 --latency 0.3
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pandas as pd  # noqa: E402
+
+import app  # noqa: E402
+from cache import ResponseCache  # noqa: E402
+from metrics import percentile, run_metrics  # noqa: E402
+from mock_server import MockConfig, start_mock_server  # noqa: E402
+from transport import PooledSession  # noqa: E402
+
+RESULTS_DIR = os.path.join(ROOT, "bench", "results")
+
+# A scenario counts as regressed when throughput drops or p95 grows by more than this
+REGRESSION_THRESHOLD = 0.10
+
+
+def peak_rss_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def run_scenario(api_base: str, prompts, mode: str, concurrency: int, cache: ResponseCache):
+    collector = run_metrics()
+    search = make_search(api_base, concurrency, cache, collector)
+    latencies, errors = [], 0
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    for _, _, answer, elapsed in search.run_batch(prompts, mode, ["bench-doc"], "Bench Co", max_workers=concurrency):
+        latencies.append(elapsed)
+        if not answer:
+            errors += 1
+    wall = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "mode": mode,
+        "concurrency": concurrency,
+        "prompts": len(prompts),
+        "seconds": round(wall, 3),
+        "throughput": round(len(prompts) / wall, 3),
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "errors": errors,
+        "python_peak_mb": round(peak / (1024 * 1024), 2),
+        "calls": {name: entry.get("calls", 0) for name, entry in collector.snapshot().items()}
+    }
+
+
+def make_search(api_base, concurrency, cache, collector):
+    """HybridSearch with a fresh pool sized to the concurrency level"""
+    # Caching is off so every prompt hits the API
+    session = PooledSession(pool_maxsize=max(concurrency, 2) * 2, retries=0)
+    return app.HybridSearch(api_base=api_base, session=session, cache=cache, use_cache=False, metrics=collector)
+
+
+def run_upload_scenario(api_base: str, count: int, size_mb: float):
+    app.API_BASE = api_base
+    latencies = []
+    wall = 0.0
+    for _ in range(count):
+        # Distinct content each time, otherwise uploads after the first are deduplicated
+        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as f:
+            f.write(b"%PDF-1.4\n" + os.urandom(int(size_mb * 1024 * 1024)))
+            path = f.name
+        try:
+            t0 = time.perf_counter()
+            app.upload_and_get_doc_id(path)
+            latencies.append(time.perf_counter() - t0)
+            wall += latencies[-1]
+        finally:
+            os.remove(path)
+    return {
+        "mode": "upload",
+        "concurrency": 1,
+        "prompts": count,
+        "seconds": round(wall, 3),
+        "throughput": round(count / wall, 3),
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "errors": 0,
+        "size_mb": size_mb
+    }
+
+
+def load_previous():
+    if not os.path.isdir(RESULTS_DIR):
+        return None
+    files = sorted(f for f in os.listdir(RESULTS_DIR) if f.endswith(".json"))
+    if not files:
+        return None
+    with open(os.path.join(RESULTS_DIR, files[-1])) as f:
+        return json.load(f)
+
+
+def compare(previous, current):
+    baseline = {(r["mode"], r["concurrency"]): r for r in previous["scenarios"]}
+    regressions = []
+    print(f"\nCompared with {previous['revision']} ({previous['timestamp']}):")
+    for result in current["scenarios"]:
+        before = baseline.get((result["mode"], result["concurrency"]))
+        if not before:
+            continue
+        throughput_change = result["throughput"] / before["throughput"] - 1 if before["throughput"] else 0
+        p95_change = result["p95"] / before["p95"] - 1 if before.get("p95") else 0
+        flag = ""
+        if throughput_change < -REGRESSION_THRESHOLD or p95_change > REGRESSION_THRESHOLD:
+            flag = "  <-- REGRESSION"
+            regressions.append(result)
+        print(f"  {result['mode']:<15} c={result['concurrency']:<3} "
+              f"throughput {throughput_change:+.0%}  p95 {p95_change:+.0%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark HybridSearch throughput")
+    parser.add_argument("--prompts", default=os.path.join(ROOT, "prompts.xlsx"))
+    parser.add_argument("--limit", type=int, default=50, help="Number of prompts per scenario")
+    parser.add_argument("--modes", nargs="*", default=list(app.SEARCH_MODES))
+    parser.add_argument("--concurrency", nargs="*", type=int, default=[1, 4, 8, 16])
+    parser.add_argument("--api-base", help="Benchmark a running server instead of the mock")
+    parser.add_argument("--latency", type=float, default=0.3, help="Mock median query latency (s)")
+    parser.add_argument("--sigma", type=float, default=0.4, help="Mock latency spread")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--uploads", type=int, default=3, help="Upload calls to time (0 to skip)")
+    parser.add_argument("--upload-mb", type=float, default=5.0)
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args()
+
+    args.prompts = os.path.abspath(args.prompts)
+
+    # Keep the local caches and document index of this checkout out of the benchmark
+    workdir = tempfile.mkdtemp(prefix="swot-bench-")
+    os.chdir(workdir)
+
+    api_base = args.api_base
+    if not api_base:
+        _, api_base = start_mock_server(MockConfig(latency=args.latency, sigma=args.sigma, error_rate=args.error_rate))
+        print(f"Using mock API at {api_base}")
+
+    prompts = pd.read_excel(args.prompts)["prompts"].dropna().astype(str).tolist()[:args.limit]
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = ResponseCache(os.path.join(tmp, "bench.sqlite"))
+        scenarios = []
+        for mode in args.modes:
+            for concurrency in args.concurrency:
+                result = run_scenario(api_base, prompts, mode, concurrency, cache)
+                scenarios.append(result)
+                print(f"{mode:<15} c={concurrency:<3} {result['throughput']:>7.2f} prompts/s  "
+                      f"p50 {result['p50']:.2f}s  p95 {result['p95']:.2f}s  p99 {result['p99']:.2f}s  "
+                      f"errors {result['errors']}  py-peak {result['python_peak_mb']} MB")
+
+    if args.uploads:
+        result = run_upload_scenario(api_base, args.uploads, args.upload_mb)
+        scenarios.append(result)
+        print(f"{'upload':<15} {args.upload_mb} MB  p50 {result['p50']:.2f}s  p95 {result['p95']:.2f}s")
+
+    current = {
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "api_base": "mock" if not args.api_base else args.api_base,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "scenarios": scenarios
+    }
+    print(f"\nPeak RSS: {current['peak_rss_mb']} MB")
+
+    previous = load_previous()
+    regressions = compare(previous, current) if previous else []
+
+    if not args.no_save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{current['revision']}.json")
+        with open(path, "w") as f:
+            json.dump(current, f, indent=2)
+        print(f"Saved results to {path}")
+
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
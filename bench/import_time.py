@@ -0,0 +1,96 @@
+"""Cold-start import benchmark for the query path.
+
+Imports each module in fresh interpreters, reports the median wall time and the slowest
+imports (from -X importtime), and exits 1 if a module is over its target or pulls in a
+dependency that should only load on first use.
+
+Example:
+    python bench/import_time.py --runs 7
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Median cold import time allowed per module, in seconds
+IMPORT_TARGETS = {
+    "app": 0.6,
+}
+
+# Onboarding-only dependencies that must not be imported by the query path
+LAZY_MODULES = ("googlesearch", "bs4", "weasyprint", "pandas", "http.server")
+
+_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+loaded = [name for name in {lazy!r} if name in sys.modules]
+print(json.dumps([elapsed, loaded]))
+"""
+
+
+def time_import(module: str):
+    """(seconds, eagerly loaded lazy modules) for one cold import of module"""
+    output = subprocess.check_output(
+        [sys.executable, "-c", _PROBE.format(module=module, lazy=LAZY_MODULES)],
+        cwd=ROOT, text=True
+    )
+    elapsed, loaded = json.loads(output.strip().splitlines()[-1])
+    return elapsed, loaded
+
+
+def slowest_imports(module: str, top: int):
+    """Top (cumulative microseconds, name) entries from python -X importtime"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, text=True, capture_output=True
+    )
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        entries.append((int(cumulative), name.strip()))
+    return sorted(entries, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold import time of the query path")
+    parser.add_argument("--modules", nargs="*", default=list(IMPORT_TARGETS))
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--target", type=float, help="Override the per-module target (seconds)")
+    parser.add_argument("--top", type=int, default=10, help="Slowest imports to list")
+    args = parser.parse_args()
+
+    failed = False
+    for module in args.modules:
+        samples, eager = [], set()
+        for _ in range(args.runs):
+            elapsed, loaded = time_import(module)
+            samples.append(elapsed)
+            eager.update(loaded)
+        median = statistics.median(samples)
+        target = args.target or IMPORT_TARGETS.get(module)
+
+        status = "ok"
+        if target is not None and median > target:
+            status = f"OVER TARGET ({target:.2f}s)"
+            failed = True
+        if eager:
+            status += f", eagerly imports {', '.join(sorted(eager))}"
+            failed = True
+        print(f"{module:<12} median {median:.3f}s  min {min(samples):.3f}s  ({args.runs} runs)  {status}")
+
+        for cumulative, name in slowest_imports(module, args.top):
+            print(f"    {cumulative / 1e6:7.3f}s  {name}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
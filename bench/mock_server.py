@@ -0,0 +1,200 @@
+"""Local stand-in for the vector-DB API (/documents, /upload/, /query/, /query/batch).
+
+Latency is drawn from a log-normal distribution, a configurable share of requests fail
+with 503, and /query/?stream=true answers as server-sent events.
+
+Run standalone:
+    python bench/mock_server.py --port 2345 --latency 1.5 --error-rate 0.02
+"""
+import argparse
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Tuple
+from urllib.parse import parse_qs, urlparse
+
+
+@dataclass
+class MockConfig:
+    latency: float = 0.5          # median /query/ latency in seconds
+    sigma: float = 0.4            # log-normal shape; larger means a heavier tail
+    error_rate: float = 0.0       # share of /query/ and /upload/ calls answered with 503
+    upload_latency: float = 1.0   # median /upload/ processing time in seconds
+    stream_chunks: int = 20       # tokens per streamed answer
+    answer_words: int = 120       # words per answer
+    documents: int = 50           # documents pre-seeded into /documents
+
+
+class MockState:
+    def __init__(self, config: MockConfig, seed: int = 0):
+        self.config = config
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.documents = [
+            {"doc_id": uuid.uuid4().hex, "file_name": f"Company_{i}_Annual_Report.pdf", "uploaded_at": i}
+            for i in range(config.documents)
+        ]
+        self.hashes = {}
+
+    def sample_latency(self, median: float) -> float:
+        with self.lock:
+            return median * math.exp(self.random.gauss(0, self.config.sigma))
+
+    def should_fail(self) -> bool:
+        with self.lock:
+            return self.random.random() < self.config.error_rate
+
+    def answer(self, query: str) -> str:
+        words = (query.split() or ["answer"]) * (self.config.answer_words // max(1, len(query.split())) + 1)
+        return " ".join(words[:self.config.answer_words])
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state: MockState = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload, status: int = 200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self) -> bytes:
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            parts = []
+            while True:
+                size = int(self.rfile.readline().split(b";")[0].strip() or b"0", 16)
+                if size == 0:
+                    self.rfile.readline()
+                    break
+                parts.append(self.rfile.read(size))
+                self.rfile.readline()
+            return b"".join(parts)
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def _route(self) -> Tuple[str, dict]:
+        parsed = urlparse(self.path)
+        return parsed.path.rstrip("/") or "/", parse_qs(parsed.query)
+
+    def do_GET(self):
+        path, query = self._route()
+        if path == "/documents":
+            since = query.get("since", [None])[0]
+            documents = self.state.documents
+            if since is not None:
+                documents = [d for d in documents if d["uploaded_at"] > int(since)]
+            self._send_json({"documents": documents})
+        elif path == "/query":
+            self._query(query)
+        else:
+            self._send_json({"detail": "Not Found"}, 404)
+
+    def do_POST(self):
+        path, _ = self._route()
+        body = self._read_body()
+        if path == "/upload":
+            self._upload(body)
+        elif path == "/query/batch":
+            self._batch(json.loads(body or b"{}"))
+        else:
+            self._send_json({"detail": "Not Found"}, 404)
+
+    def _query(self, query):
+        text = query.get("query", [""])[0]
+        time.sleep(self.state.sample_latency(self.state.config.latency))
+        if self.state.should_fail():
+            self._send_json({"detail": "overloaded"}, 503)
+            return
+        answer = self.state.answer(text)
+
+        if query.get("stream", ["false"])[0] != "true":
+            self._send_json({"content": answer})
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        words = answer.split()
+        step = max(1, len(words) // self.state.config.stream_chunks)
+        for i in range(0, len(words), step):
+            event = f"data: {json.dumps({'delta': ' '.join(words[i:i + step]) + ' '})}\n\n".encode("utf-8")
+            self.wfile.write(f"{len(event):x}\r\n".encode() + event + b"\r\n")
+            self.wfile.flush()
+            time.sleep(0.01)
+        done = b"data: [DONE]\n\n"
+        self.wfile.write(f"{len(done):x}\r\n".encode() + done + b"\r\n0\r\n\r\n")
+
+    def _batch(self, payload):
+        shared = payload.get("shared", {})
+        queries = payload.get("queries", [])
+        # Shared retrieval: one base latency plus a small per-item generation cost
+        time.sleep(self.state.sample_latency(self.state.config.latency) * (1 + 0.15 * len(queries)))
+        if self.state.should_fail():
+            self._send_json({"detail": "overloaded"}, 503)
+            return
+        results = [{"content": self.state.answer({**shared, **q}.get("query", ""))} for q in queries]
+        self._send_json({"results": results})
+
+    def _upload(self, body: bytes):
+        time.sleep(self.state.sample_latency(self.state.config.upload_latency))
+        if self.state.should_fail():
+            self._send_json({"detail": "overloaded"}, 503)
+            return
+        digest = hashlib.sha256(body).hexdigest()
+        with self.state.lock:
+            doc_id = self.state.hashes.get(digest)
+            if doc_id is None:
+                doc_id = uuid.uuid4().hex
+                self.state.hashes[digest] = doc_id
+                self.state.documents.append({
+                    "doc_id": doc_id, "file_name": f"upload_{len(self.state.documents)}.pdf",
+                    "uploaded_at": len(self.state.documents)
+                })
+        self._send_json({"doc_id": doc_id, "bytes": len(body)})
+
+
+def start_mock_server(config: MockConfig = None, port: int = 0, host: str = "127.0.0.1") -> Tuple[ThreadingHTTPServer, str]:
+    """Start the mock API in a daemon thread; returns the server and its base URL"""
+    handler = type("BoundMockHandler", (MockHandler,), {"state": MockState(config or MockConfig())})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the mock vector-DB API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=2345)
+    parser.add_argument("--latency", type=float, default=MockConfig.latency)
+    parser.add_argument("--sigma", type=float, default=MockConfig.sigma)
+    parser.add_argument("--error-rate", type=float, default=MockConfig.error_rate)
+    parser.add_argument("--upload-latency", type=float, default=MockConfig.upload_latency)
+    args = parser.parse_args()
+
+    config = MockConfig(
+        latency=args.latency, sigma=args.sigma, error_rate=args.error_rate, upload_latency=args.upload_latency
+    )
+    server, url = start_mock_server(config, args.port, args.host)
+    print(f"Mock API listening on {url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
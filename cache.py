@@ -0,0 +1,126 @@
+"""On-disk response cache for HybridSearch queries"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+CACHE_DIR = ".cache"
+CACHE_PATH = os.path.join(CACHE_DIR, "responses.sqlite")
+
+# Time-to-live per search_type in seconds. Document answers only change when the
+# doc_id set changes (which is part of the key); web answers go stale quickly.
+CACHE_TTLS = {
+    "documents": 30 * 24 * 3600,
+    "web": 6 * 3600,
+    "domain": 6 * 3600,
+}
+DEFAULT_TTL = 3600
+
+# Least recently used entries are evicted beyond this many rows
+CACHE_MAX_ENTRIES = 5000
+
+
+def cache_key(params: Dict[str, Any]) -> str:
+    """Content address of a query: hash of the normalized request parameters"""
+    normalized = {}
+    for key, value in params.items():
+        if value is None:
+            continue
+        if isinstance(value, (list, tuple, set)):
+            value = sorted(str(item) for item in value)
+        elif isinstance(value, str):
+            value = value.strip()
+        normalized[key] = value
+    payload = json.dumps(normalized, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """SQLite-backed cache with per-search-type TTLs and an LRU size cap"""
+
+    def __init__(self, path: str = CACHE_PATH, ttls: Dict[str, int] = None, max_entries: int = CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttls = CACHE_TTLS if ttls is None else ttls
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                search_type TEXT,
+                value TEXT,
+                created_at REAL,
+                last_access REAL
+            )"""
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON responses(last_access)")
+        self.conn.commit()
+
+    def get(self, params: Dict[str, Any], max_age: Optional[float] = None) -> Optional[Any]:
+        """Cached value for params, if younger than max_age (default: the search_type's TTL)"""
+        key = cache_key(params)
+        ttl = max_age if max_age is not None else self.ttls.get(params.get("search_type"), DEFAULT_TTL)
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT value, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > ttl:
+                self.misses += 1
+                return None
+            self.conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self.conn.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, params: Dict[str, Any], value: Any):
+        key = cache_key(params)
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses (key, search_type, value, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, params.get("search_type"), json.dumps(value), now, now)
+            )
+            self._evict()
+            self.conn.commit()
+
+    def _evict(self):
+        count = self.conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        if count > self.max_entries:
+            self.conn.execute(
+                "DELETE FROM responses WHERE key IN "
+                "(SELECT key FROM responses ORDER BY last_access ASC LIMIT ?)",
+                (count - self.max_entries,)
+            )
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM responses")
+            self.conn.commit()
+
+    def stats(self) -> Dict[str, int]:
+        with self.lock:
+            entries = self.conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "entries": entries}
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    """Return the process-wide response cache, opening it on first use"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ResponseCache()
+        return _default_cache
@@ -0,0 +1,217 @@
+"""Local ticker/CIK index built from SEC's company_tickers.json"""
+import json
+import os
+import re
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from metrics import error_class, record_call
+from transport import get_session
+
+TICKERS_URL = "https://www.sec.gov/files/company_tickers.json"
+INDEX_DIR = ".cache"
+TICKERS_PATH = os.path.join(INDEX_DIR, "company_tickers.json")
+META_PATH = os.path.join(INDEX_DIR, "company_tickers.meta.json")
+
+# How often the local copy is revalidated against SEC (conditional GET)
+REFRESH_INTERVAL = 24 * 3600
+
+# Minimum fuzzy score for a match to be returned
+FUZZY_THRESHOLD = 0.35
+
+# Corporate suffixes ignored when comparing names
+NAME_SUFFIXES = (
+    "incorporated", "inc", "corporation", "corp", "company", "co", "limited", "ltd",
+    "plc", "llc", "lp", "sa", "ag", "nv", "se", "holdings", "holding", "group", "the"
+)
+_SUFFIX_RE = re.compile(r"\b(" + "|".join(NAME_SUFFIXES) + r")\b")
+
+
+def _normalize(name: str) -> str:
+    return re.sub(r"[^a-z0-9]", "", name.lower())
+
+
+def _core_name(name: str) -> str:
+    """Normalized name with punctuation and corporate suffixes removed"""
+    words = re.sub(r"[^a-z0-9 ]", " ", name.lower())
+    return _normalize(_SUFFIX_RE.sub(" ", words)) or _normalize(name)
+
+
+def _trigrams(text: str) -> set:
+    padded = f"${text}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class CikIndex:
+    """Exact ticker/name hash lookups with a ranked trigram fallback"""
+
+    def __init__(self, headers: Dict[str, str], path: str = TICKERS_PATH, meta_path: str = META_PATH):
+        self.headers = headers
+        self.path = path
+        self.meta_path = meta_path
+        self.loaded_at = 0.0
+        self.refreshing = False
+        self.lock = threading.Lock()
+
+        self.entries: List[Tuple[str, str, str]] = []  # (cik, ticker, title)
+        self.cores: List[str] = []
+        self.core_sizes: List[int] = []
+        self.by_ticker: Dict[str, int] = {}
+        self.by_name: Dict[str, int] = {}
+        self.by_trigram: Dict[str, List[int]] = {}
+
+    def _read_meta(self) -> Dict[str, str]:
+        try:
+            with open(self.meta_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def refresh(self) -> bool:
+        """Revalidate the local copy with SEC; returns True if new data was written"""
+        meta = self._read_meta()
+        headers = dict(self.headers)
+        if os.path.exists(self.path):
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+        started = time.perf_counter()
+        try:
+            response = get_session().get(TICKERS_URL, headers=headers)
+        except Exception as e:
+            record_call("sec", "company_tickers", started, error=error_class(e))
+            print(f"Failed to refresh CIK list: {e}")
+            return False
+        record_call("sec", "company_tickers", started, response)
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        if response.status_code == 304:
+            meta["fetched_at"] = time.time()
+        elif response.ok:
+            with open(self.path, "wb") as f:
+                f.write(response.content)
+            meta = {
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "fetched_at": time.time()
+            }
+        else:
+            print("Failed to get CIK list:", response.status_code)
+            return False
+
+        with open(self.meta_path, "w") as f:
+            json.dump(meta, f)
+        return response.status_code != 304
+
+    def load(self):
+        """Load the index from disk, fetching it first if missing or stale"""
+        meta = self._read_meta()
+        stale = time.time() - meta.get("fetched_at", 0) > REFRESH_INTERVAL
+        if not os.path.exists(self.path) or stale:
+            self.refresh()
+        if not os.path.exists(self.path):
+            return
+
+        with open(self.path) as f:
+            data = json.load(f)
+        self._build(data.values() if isinstance(data, dict) else data)
+        self.loaded_at = time.time()
+
+    def _build(self, records):
+        entries, cores, core_sizes, by_ticker, by_name, by_trigram = [], [], [], {}, {}, {}
+        for record in records:
+            i = len(entries)
+            title = record.get("title", "")
+            ticker = (record.get("ticker") or "").upper()
+            entries.append((str(record["cik_str"]).zfill(10), ticker, title))
+
+            if ticker:
+                by_ticker.setdefault(ticker, i)
+            # First listing wins, which keeps the primary share class for multi-ticker issuers
+            by_name.setdefault(_normalize(title), i)
+            core = _core_name(title)
+            by_name.setdefault(core, i)
+            grams = _trigrams(core)
+            cores.append(core)
+            core_sizes.append(len(grams))
+            for gram in grams:
+                by_trigram.setdefault(gram, []).append(i)
+
+        with self.lock:
+            self.entries, self.cores, self.core_sizes = entries, cores, core_sizes
+            self.by_ticker, self.by_name, self.by_trigram = by_ticker, by_name, by_trigram
+
+    def _refresh_in_background(self):
+        with self.lock:
+            if self.refreshing:
+                return
+            self.refreshing = True
+
+        def run():
+            try:
+                if self.refresh():
+                    self.load()
+                else:
+                    self.loaded_at = time.time()
+            finally:
+                self.refreshing = False
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def lookup(self, name: str) -> Optional[str]:
+        """Return the zero-padded CIK best matching a company name or ticker"""
+        if not self.entries:
+            self.load()
+        elif time.time() - self.loaded_at > REFRESH_INTERVAL:
+            self._refresh_in_background()
+
+        match = self._exact(name)
+        if match is None:
+            match = self._fuzzy(name)
+        return self.entries[match][0] if match is not None else None
+
+    def _exact(self, name: str) -> Optional[int]:
+        for key in (_normalize(name), _core_name(name)):
+            if key in self.by_name:
+                return self.by_name[key]
+        return self.by_ticker.get(name.strip().upper())
+
+    def _fuzzy(self, name: str) -> Optional[int]:
+        core = _core_name(name)
+        grams = _trigrams(core)
+        size = len(grams)
+        overlaps = Counter()
+        for gram in grams:
+            overlaps.update(self.by_trigram.get(gram, ()))
+
+        # Jaccard is at most shared / size and a name starting with the query shares all but one
+        # of its trigrams, so names below min_shared cannot reach FUZZY_THRESHOLD; skip them
+        # before scoring instead of scoring every name that shares a single common trigram.
+        min_shared = min(int(FUZZY_THRESHOLD * size), size - 1)
+        best, best_score = None, 0.0
+        for i in [i for i, shared in overlaps.items() if shared >= min_shared]:
+            shared = overlaps[i]
+            score = shared / (size + self.core_sizes[i] - shared)
+            if self.cores[i].startswith(core):
+                score += 0.25
+            if score > best_score or (score == best_score and best is not None and i < best):
+                best, best_score = i, score
+        return best if best_score >= FUZZY_THRESHOLD else None
+
+
+_default_index = None
+_default_index_lock = threading.Lock()
+
+
+def get_cik_index(headers: Dict[str, str]) -> CikIndex:
+    """Return the process-wide CIK index, loading it on first use"""
+    global _default_index
+    with _default_index_lock:
+        if _default_index is None:
+            _default_index = CikIndex(headers)
+            _default_index.load()
+        return _default_index
@@ -0,0 +1,230 @@
+"""Locally maintained company -> doc_id index over the vector database's documents"""
+import json
+import os
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+INDEX_DIR = ".cache"
+INDEX_PATH = os.path.join(INDEX_DIR, "documents_index.json")
+
+# Lookups older than this trigger an incremental sync before answering
+SYNC_INTERVAL = 15 * 60
+
+# Incremental syncs only see additions; a full listing older than this is redone before
+# trusting that a document still exists (documents can be deleted server-side)
+RECONCILE_INTERVAL = 15 * 60
+
+# Report-type suffixes appended by download_pdf / download_sec_10k
+REPORT_SUFFIXES = ("10k", "annualreport")
+
+# Fields the /documents endpoint may use to order documents, newest last
+CURSOR_FIELDS = ("uploaded_at", "created_at", "updated_at")
+
+
+def cursor_value(value: Any) -> Any:
+    """Comparable form of a cursor field: numbers as numbers, ISO timestamps as aware datetimes"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return float(value)
+        except ValueError:
+            pass
+        try:
+            parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return value
+        return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+    return value
+
+
+def is_later(value: Any, cursor: Any) -> bool:
+    """Whether value comes after cursor; values of different kinds fall back to comparing as text"""
+    value, cursor = cursor_value(value), cursor_value(cursor)
+    if type(value) is not type(cursor):
+        return str(value) > str(cursor)
+    return value > cursor
+
+
+def company_key(file_name: str) -> str:
+    """Normalized company key for a document file name"""
+    stem = os.path.splitext(os.path.basename(file_name))[0]
+    key = re.sub(r"[^a-zA-Z0-9]", "", stem).lower()
+    for suffix in REPORT_SUFFIXES:
+        if key.endswith(suffix) and len(key) > len(suffix):
+            return key[:-len(suffix)]
+    return key
+
+
+class DocumentIndex:
+    """Maps normalized company keys to doc_ids, synced incrementally from /documents"""
+
+    def __init__(self, fetch: Callable[[Optional[Dict[str, Any]]], Any], path: str = INDEX_PATH):
+        self.fetch = fetch
+        self.path = path
+        self.lock = threading.RLock()
+        self.cursor = None
+        self.synced_at = 0.0
+        self.reconciled_at = 0.0
+        self.docs: Dict[str, str] = {}
+        self.by_company: Dict[str, List[str]] = {}
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return
+        self.cursor = state.get("cursor")
+        self.synced_at = state.get("synced_at", 0.0)
+        self.reconciled_at = state.get("reconciled_at", 0.0)
+        for doc_id, file_name in state.get("docs", {}).items():
+            self._add(doc_id, file_name)
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({
+                "cursor": self.cursor, "synced_at": self.synced_at, "reconciled_at": self.reconciled_at, "docs": self.docs
+            }, f)
+        os.replace(tmp_path, self.path)
+
+    def _add(self, doc_id: str, file_name: str):
+        if doc_id in self.docs:
+            return
+        self.docs[doc_id] = file_name
+        self.by_company.setdefault(company_key(file_name), []).append(doc_id)
+
+    def _remove(self, doc_id: str):
+        file_name = self.docs.pop(doc_id, None)
+        if file_name is None:
+            return
+        key = company_key(file_name)
+        doc_ids = self.by_company.get(key, [])
+        if doc_id in doc_ids:
+            doc_ids.remove(doc_id)
+        if not doc_ids:
+            self.by_company.pop(key, None)
+
+    def add(self, doc_id: str, file_name: str):
+        """Record a freshly uploaded document without waiting for the next sync"""
+        with self.lock:
+            self._add(doc_id, file_name)
+            self._save()
+
+    def remove(self, doc_id: str):
+        """Forget a document deleted from the database"""
+        with self.lock:
+            self._remove(doc_id)
+            self._save()
+
+    def contains(self, doc_id: str, max_age: float = RECONCILE_INTERVAL) -> bool:
+        """Whether doc_id is still in the database.
+
+        The index is reconciled against a full listing when that is older than max_age,
+        and synced once if it does not know doc_id.
+        """
+        with self.lock:
+            if time.time() - self.reconciled_at > max_age:
+                self.reconcile()
+            elif doc_id not in self.docs:
+                self.sync()
+            return doc_id in self.docs
+
+    def sync(self):
+        """Fetch documents added since the last cursor and merge them into the index"""
+        with self.lock:
+            params = {"since": self.cursor} if self.cursor else None
+            try:
+                response = self.fetch(params)
+            except Exception as e:
+                print(f"Error syncing document index: {str(e)}")
+                return
+
+            documents, cursor = response, None
+            if isinstance(response, dict):
+                documents = response.get("documents", [])
+                cursor = response.get("next_cursor") or response.get("cursor")
+
+            for doc in documents or []:
+                if not isinstance(doc, dict) or not doc.get("doc_id"):
+                    continue
+                self._add(doc["doc_id"], doc.get("file_name", ""))
+                if cursor is None:
+                    for field in CURSOR_FIELDS:
+                        if doc.get(field) and (self.cursor is None or is_later(doc[field], self.cursor)):
+                            self.cursor = doc[field]
+
+            if cursor is not None:
+                self.cursor = cursor
+            self.synced_at = time.time()
+            self._save()
+
+    def reconcile(self):
+        """Re-list every document and drop the ones that were deleted from the database"""
+        with self.lock:
+            listed: Dict[str, str] = {}
+            params = None
+            while True:
+                try:
+                    response = self.fetch(params)
+                except Exception as e:
+                    # Keep the index as it is rather than dropping documents we could not list
+                    print(f"Error reconciling document index: {str(e)}")
+                    return
+                documents, cursor = response, None
+                if isinstance(response, dict):
+                    documents = response.get("documents", [])
+                    cursor = response.get("next_cursor") or response.get("cursor")
+                new = [doc for doc in documents or [] if isinstance(doc, dict) and doc.get("doc_id") and doc["doc_id"] not in listed]
+                for doc in new:
+                    listed[doc["doc_id"]] = doc.get("file_name", "")
+                # A paging cursor is followed until a page adds nothing
+                if cursor is None or not new or cursor == (params or {}).get("since"):
+                    break
+                params = {"since": cursor}
+
+            for doc_id in list(self.docs):
+                if doc_id not in listed:
+                    self._remove(doc_id)
+            for doc_id, file_name in listed.items():
+                self._add(doc_id, file_name)
+            self.reconciled_at = self.synced_at = time.time()
+            self._save()
+
+    def _match(self, key: str) -> List[str]:
+        if key in self.by_company:
+            return list(self.by_company[key])
+        # Loose match over company keys (far fewer than documents)
+        return [doc_id for company, doc_ids in self.by_company.items() if key in company for doc_id in doc_ids]
+
+    def find(self, company_name: str, max_age: float = SYNC_INTERVAL) -> List[Dict[str, str]]:
+        """Return {doc_id, file_name} records for a company"""
+        key = re.sub(r"[^a-zA-Z0-9]", "", company_name).lower()
+        with self.lock:
+            if time.time() - self.synced_at > max_age:
+                self.sync()
+            doc_ids = self._match(key)
+            if not doc_ids and self.synced_at < time.time() - 1:
+                # A miss may just mean the document arrived after our last sync
+                self.sync()
+                doc_ids = self._match(key)
+            return [{"doc_id": doc_id, "file_name": self.docs[doc_id]} for doc_id in doc_ids]
+
+
+_default_index = None
+_default_index_lock = threading.Lock()
+
+
+def get_document_index(fetch: Callable[[Optional[Dict[str, Any]]], Any]) -> DocumentIndex:
+    """Return the process-wide document index"""
+    global _default_index
+    with _default_index_lock:
+        if _default_index is None:
+            _default_index = DocumentIndex(fetch)
+        return _default_index
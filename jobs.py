@@ -0,0 +1,379 @@
+"""Background analysis jobs: a SQLite job/task queue served by one shared worker pool.
+
+The UI enqueues a job (company, mode, prompts) and polls it; answers are written to the
+task table and the result store as workers finish them, so runs survive script reruns.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+from app import QUERY_BATCH_SIZE, HybridSearch
+from limiter import get_backend
+from manifest import RunManifest
+from metrics import Metrics, run_metrics
+from outputs import OUTPUT_DIR
+from result_store import get_result_store, new_run_id
+
+JOBS_PATH = os.path.join(OUTPUT_DIR, "jobs.sqlite")
+
+# Prompts answered at once across all jobs, analysts and companies
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "16"))
+
+# Seconds an idle worker waits before checking the queue again
+IDLE_POLL = 1.0
+
+NO_RESPONSE = "No response returned."
+
+ACTIVE_STATUSES = ("queued", "running")
+
+# Runs of a prompt before it is marked failed, and the delay before the first retry
+# (doubled on each attempt, and never before the backend's circuit breaker lets requests through)
+TASK_ATTEMPTS = 4
+RETRY_DELAY = 15.0
+
+# Task is waiting to run (tasks aliased as t); takes the current time as a parameter
+_READY = "t.status = 'queued' AND t.not_before <= ?"
+
+
+class JobQueue:
+    """jobs(one row per Run Analysis click) and tasks(one row per prompt) in SQLite"""
+
+    def __init__(self, path: str = JOBS_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                owner TEXT,
+                company TEXT,
+                mode TEXT,
+                doc_ids TEXT,
+                sector TEXT,
+                use_cache INTEGER,
+                batch INTEGER,
+                run_id TEXT,
+                status TEXT,
+                total INTEGER,
+                completed INTEGER,
+                reused INTEGER,
+                created_at REAL,
+                started_at REAL,
+                finished_at REAL,
+                last_served REAL DEFAULT 0
+            )"""
+        )
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS tasks (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                job_id TEXT,
+                position INTEGER,
+                category TEXT,
+                prompt TEXT,
+                status TEXT,
+                answer TEXT,
+                latency REAL,
+                reused INTEGER DEFAULT 0,
+                finished_at REAL,
+                attempts INTEGER DEFAULT 0,
+                not_before REAL DEFAULT 0
+            )"""
+        )
+        # Queues created before failed prompts were retried
+        columns = {row["name"] for row in self.conn.execute("PRAGMA table_info(tasks)")}
+        for column in ("attempts INTEGER DEFAULT 0", "not_before REAL DEFAULT 0"):
+            if column.split()[0] not in columns:
+                self.conn.execute(f"ALTER TABLE tasks ADD COLUMN {column}")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_job ON tasks(job_id, status, position)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, owner, last_served)")
+        self.conn.commit()
+
+    def enqueue(
+        self,
+        company: str,
+        mode: str,
+        prompts: List[Tuple[str, str]],
+        doc_ids: List[str] = None,
+        sector: str = None,
+        use_cache: bool = True,
+        reuse: bool = True,
+        batch: bool = False,
+        owner: str = "default"
+    ) -> str:
+        """Add a job for (category, prompt) pairs; prompts unchanged since the last run are answered at once"""
+        job_id = uuid.uuid4().hex
+        run_id = new_run_id()
+        doc_ids = doc_ids or []
+        store = get_result_store()
+        manifest = RunManifest(company) if reuse else None
+
+        rows, reused = [], 0
+        for position, (category, prompt) in enumerate(prompts):
+            previous = manifest.get(prompt, mode, doc_ids, sector=sector) if manifest else None
+            if previous is not None:
+                reused += 1
+                store.append(run_id, company, category, prompt, mode, previous, None, doc_ids, position)
+                rows.append((job_id, position, category, prompt, "done", previous, 1, time.time()))
+            else:
+                rows.append((job_id, position, category, prompt, "queued", None, 0, None))
+
+        now = time.time()
+        status = "done" if reused == len(prompts) else "queued"
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO jobs (id, owner, company, mode, doc_ids, sector, use_cache, batch, run_id, status, "
+                "total, completed, reused, created_at, finished_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, owner, company, mode, json.dumps(doc_ids), sector, int(use_cache), int(batch), run_id, status,
+                 len(prompts), reused, reused, now, now if status == "done" else None)
+            )
+            self.conn.executemany(
+                "INSERT INTO tasks (job_id, position, category, prompt, status, answer, reused, finished_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            self.conn.commit()
+        return job_id
+
+    def claim(self) -> Optional[Tuple[Dict[str, Any], List[Dict[str, Any]]]]:
+        """Take the next task (or category batch) with fair round-robin scheduling.
+
+        The owner served least recently goes first, then that owner's least recently served
+        job, so one large run cannot starve other analysts or companies.
+        """
+        now = time.time()
+        with self.lock:
+            owner = self.conn.execute(
+                "SELECT owner FROM jobs j WHERE status IN ('queued', 'running') AND EXISTS "
+                f"(SELECT 1 FROM tasks t WHERE t.job_id = j.id AND {_READY}) "
+                "GROUP BY owner ORDER BY MAX(last_served), MIN(created_at) LIMIT 1",
+                (now,)
+            ).fetchone()
+            if owner is None:
+                return None
+            job = self.conn.execute(
+                "SELECT * FROM jobs j WHERE owner = ? AND status IN ('queued', 'running') AND EXISTS "
+                f"(SELECT 1 FROM tasks t WHERE t.job_id = j.id AND {_READY}) "
+                "ORDER BY last_served, created_at LIMIT 1",
+                (owner["owner"], now)
+            ).fetchone()
+
+            first = self.conn.execute(
+                f"SELECT * FROM tasks t WHERE job_id = ? AND {_READY} ORDER BY position LIMIT 1", (job["id"], now)
+            ).fetchone()
+            if job["batch"]:
+                # Batched jobs send a category's remaining prompts together
+                tasks = self.conn.execute(
+                    f"SELECT * FROM tasks t WHERE job_id = ? AND {_READY} AND category = ? "
+                    "ORDER BY position LIMIT ?",
+                    (job["id"], now, first["category"], QUERY_BATCH_SIZE)
+                ).fetchall()
+            else:
+                tasks = [first]
+
+            self.conn.executemany("UPDATE tasks SET status = 'running' WHERE id = ?", [(t["id"],) for t in tasks])
+            self.conn.execute(
+                "UPDATE jobs SET status = 'running', last_served = ?, started_at = COALESCE(started_at, ?) WHERE id = ?",
+                (now, now, job["id"])
+            )
+            self.conn.commit()
+        return dict(job), [dict(t) for t in tasks]
+
+    def retry(self, task_id: int, delay: float) -> bool:
+        """Requeue a failed task to run again after delay seconds; False once it is out of attempts"""
+        with self.lock:
+            requeued = self.conn.execute(
+                "UPDATE tasks SET status = 'queued', attempts = attempts + 1, not_before = ? "
+                "WHERE id = ? AND status = 'running' AND attempts + 1 < ? AND job_id IN "
+                "(SELECT id FROM jobs WHERE status IN ('queued', 'running'))",
+                (time.time() + delay, task_id, TASK_ATTEMPTS)
+            ).rowcount == 1
+            self.conn.commit()
+        return requeued
+
+    def waiting(self, job_id: str) -> int:
+        """Failed tasks of a job waiting to be retried"""
+        with self.lock:
+            return self.conn.execute(
+                "SELECT COUNT(*) FROM tasks WHERE job_id = ? AND status = 'queued' AND attempts > 0", (job_id,)
+            ).fetchone()[0]
+
+    def complete(self, task_id: int, job_id: str, answer: str, latency: float, ok: bool) -> bool:
+        """Store a task's answer; returns True if this finished the job"""
+        with self.lock:
+            self.conn.execute(
+                "UPDATE tasks SET status = ?, answer = ?, latency = ?, finished_at = ? WHERE id = ?",
+                ("done" if ok else "failed", answer, latency, time.time(), task_id)
+            )
+            self.conn.execute("UPDATE jobs SET completed = completed + 1 WHERE id = ?", (job_id,))
+            remaining = self.conn.execute(
+                "SELECT COUNT(*) FROM tasks WHERE job_id = ? AND status IN ('queued', 'running')", (job_id,)
+            ).fetchone()[0]
+            finished = False
+            if remaining == 0:
+                finished = self.conn.execute(
+                    "UPDATE jobs SET status = 'done', finished_at = ? WHERE id = ? AND status = 'running'",
+                    (time.time(), job_id)
+                ).rowcount == 1
+            self.conn.commit()
+        return finished
+
+    def cancel(self, job_id: str):
+        """Stop scheduling a job's remaining prompts; prompts already running still finish"""
+        with self.lock:
+            self.conn.execute(
+                "UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE id = ? AND status IN ('queued', 'running')",
+                (time.time(), job_id)
+            )
+            self.conn.execute("UPDATE tasks SET status = 'cancelled' WHERE job_id = ? AND status = 'queued'", (job_id,))
+            self.conn.commit()
+
+    def recover(self):
+        """Requeue tasks left running by a previous process"""
+        with self.lock:
+            self.conn.execute(
+                "UPDATE tasks SET status = 'queued' WHERE status = 'running' AND job_id IN "
+                "(SELECT id FROM jobs WHERE status IN ('queued', 'running'))"
+            )
+            self.conn.commit()
+
+    def job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            row = self.conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def tasks(self, job_id: str, statuses: Tuple[str, ...] = None) -> List[Dict[str, Any]]:
+        """A job's tasks in prompt order, optionally only those in the given statuses"""
+        sql, params = "SELECT * FROM tasks WHERE job_id = ?", [job_id]
+        if statuses:
+            sql += f" AND status IN ({', '.join('?' for _ in statuses)})"
+            params += list(statuses)
+        with self.lock:
+            rows = self.conn.execute(sql + " ORDER BY position", params).fetchall()
+        return [dict(row) for row in rows]
+
+
+class WorkerPool:
+    """Daemon threads answering queued tasks for every job in the process"""
+
+    def __init__(self, queue: JobQueue, workers: int = JOB_WORKERS):
+        self.queue = queue
+        self.metrics: Metrics = run_metrics()
+        self.searches: Dict[bool, HybridSearch] = {}
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.stopped = threading.Event()
+
+        queue.recover()
+        self.threads = [
+            threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True) for i in range(max(1, workers))
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, *args, **kwargs) -> str:
+        """JobQueue.enqueue, then wake idle workers"""
+        job_id = self.queue.enqueue(*args, **kwargs)
+        self.wake.set()
+        return job_id
+
+    def stop(self):
+        self.stopped.set()
+        self.wake.set()
+
+    def _search(self, job: Dict[str, Any]) -> HybridSearch:
+        # One client per cache setting, shared by all jobs (session, pool and cache are shared anyway)
+        use_cache = bool(job["use_cache"])
+        with self.lock:
+            search = self.searches.get(use_cache)
+            if search is None:
+                search = self.searches[use_cache] = HybridSearch(use_cache=use_cache, metrics=self.metrics)
+        return search
+
+    def _work(self):
+        while not self.stopped.is_set():
+            try:
+                claimed = self.queue.claim()
+            except Exception as e:
+                print(f"Job queue error: {str(e)}")
+                claimed = None
+            if claimed is None:
+                self.wake.wait(IDLE_POLL)
+                self.wake.clear()
+                continue
+            self._run(*claimed)
+
+    def _run(self, job: Dict[str, Any], tasks: List[Dict[str, Any]]):
+        search = self._search(job)
+        doc_ids = json.loads(job["doc_ids"])
+        prompts = [task["prompt"] for task in tasks]
+
+        started = time.perf_counter()
+        # Legs of batched prompts are shared requests, so per-leg seconds are only kept for single prompts
+        timings = {}
+        try:
+            if len(tasks) > 1:
+                answers = search.query_batch(prompts, job["mode"], doc_ids, job["company"], sector=job["sector"])
+            else:
+                answers = [search.run_prompt(prompts[0], job["mode"], doc_ids, job["company"], timings, sector=job["sector"])]
+        except Exception as e:
+            print(f"Job {job['id']} prompt failed: {str(e)}")
+            answers = [""] * len(tasks)
+        latency = (time.perf_counter() - started) / len(tasks)
+
+        store = get_result_store()
+        answered = []
+        for task, answer in zip(tasks, answers):
+            if not answer and self.queue.retry(task["id"], self._retry_delay(task)):
+                continue
+            store.append(
+                job["run_id"], job["company"], task["category"], task["prompt"], job["mode"],
+                answer or NO_RESPONSE, latency, doc_ids, task["position"], timings or None
+            )
+            self.queue.complete(task["id"], job["id"], answer or NO_RESPONSE, latency, bool(answer))
+            if answer:
+                answered.append((task, answer))
+
+        # Recorded as prompts finish, so a job cancelled partway still keeps the answers it got
+        if answered:
+            self._record_manifest(job, doc_ids, answered)
+
+    def _retry_delay(self, task: Dict[str, Any]) -> float:
+        return max(RETRY_DELAY * 2 ** task["attempts"], get_backend("api").breaker.retry_in())
+
+    def _record_manifest(self, job: Dict[str, Any], doc_ids: List[str], answered: List[Tuple[Dict[str, Any], str]]):
+        # Failed prompts are left out so that the next run retries them; save() merges with other writers
+        manifest = RunManifest(job["company"])
+        for task, answer in answered:
+            manifest.record(task["category"], task["prompt"], job["mode"], doc_ids, answer, sector=job["sector"])
+        manifest.save()
+
+
+_default_queue = None
+_default_pool = None
+_default_lock = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    """Return the process-wide job queue"""
+    global _default_queue
+    with _default_lock:
+        if _default_queue is None:
+            _default_queue = JobQueue()
+        return _default_queue
+
+
+def get_worker_pool() -> WorkerPool:
+    """Return the process-wide worker pool, starting it on first use"""
+    queue = get_job_queue()
+    global _default_pool
+    with _default_lock:
+        if _default_pool is None:
+            _default_pool = WorkerPool(queue)
+        return _default_pool
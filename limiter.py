@@ -0,0 +1,212 @@
+"""Adaptive (AIMD) concurrency limits and circuit breakers for each backend we call.
+
+Every request to a backend takes a slot from its AdaptiveLimiter. The limit grows by about
+one slot per round of healthy responses and halves when the backend throttles (429), fails
+(5xx, timeouts, connection errors), needs retries or slows down well past its usual latency.
+After repeated failed requests (judged by their final outcome) the CircuitBreaker opens and calls fail fast with BackendUnavailable
+until a single probe request succeeds.
+"""
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+# Starting, minimum and maximum requests in flight per backend
+BACKEND_LIMITS = {
+    "api": (8, 1, 64),
+    "sec": (4, 1, 10),
+    "google": (1, 1, 2),
+}
+
+# Host suffix -> backend name; the document API registers its host from app.API_BASE
+HOST_BACKENDS: Dict[str, str] = {
+    "sec.gov": "sec",
+}
+
+# A response slower than this multiple of its endpoint's average latency counts as congestion
+LATENCY_TOLERANCE = 3.0
+# Samples needed before latency is used as a signal, and weight of each new sample
+LATENCY_WARMUP = 10
+LATENCY_SMOOTHING = 0.1
+
+# Consecutive failures that open the breaker, and seconds before it lets a probe through
+FAILURE_THRESHOLD = 5
+RESET_TIMEOUT = 30.0
+
+OVERLOAD_STATUSES = (429, 500, 502, 503, 504)
+
+
+class BackendUnavailable(Exception):
+    """Raised instead of sending a request while a backend's circuit breaker is open"""
+
+    def __init__(self, backend: str, retry_in: float):
+        super().__init__(f"{backend} backend unavailable; retrying in {retry_in:.0f}s")
+        self.backend = backend
+        self.retry_in = retry_in
+
+
+def is_failure(response) -> bool:
+    """True if the final response shows the backend throttling or failing"""
+    return response.status_code in OVERLOAD_STATUSES
+
+
+def is_overloaded(response) -> bool:
+    """True if a response shows congestion: a failure, or a success that needed retries"""
+    return is_failure(response) or getattr(response, "retry_count", 0) > 0
+
+
+class AdaptiveLimiter:
+    """Additive-increase / multiplicative-decrease limit on requests in flight"""
+
+    def __init__(self, initial: int, min_limit: int = 1, max_limit: int = 64, backoff: float = 0.5):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.in_flight = 0
+        # Endpoint -> (average latency, samples); uploads and queries have very different latencies
+        self.latencies: Dict[str, Tuple[float, int]] = {}
+        self.last_decrease = 0.0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        with self.condition:
+            while self.in_flight >= int(self.limit):
+                self.condition.wait()
+            self.in_flight += 1
+
+    def release(self, latency: float, overloaded: bool, endpoint: str = ""):
+        with self.condition:
+            saturated = self.in_flight >= int(self.limit)
+            self.in_flight -= 1
+            average, samples = self.latencies.get(endpoint, (latency, 0))
+            slow = samples >= LATENCY_WARMUP and latency > LATENCY_TOLERANCE * average
+
+            now = time.monotonic()
+            if overloaded or slow:
+                # Requests sent before the last decrease report the same congestion; halve once per round trip
+                if now - self.last_decrease > latency:
+                    self.limit = max(self.min_limit, self.limit * self.backoff)
+                    self.last_decrease = now
+            elif saturated:
+                # Only grow while the limit is what holds requests back
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+
+            if not overloaded:
+                self.latencies[endpoint] = (average + LATENCY_SMOOTHING * (latency - average), samples + 1)
+            self.condition.notify_all()
+
+    def cancel(self):
+        """Give back a slot whose request ended without a usable signal (e.g. it was cancelled)"""
+        with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+
+class CircuitBreaker:
+    """closed -> open after FAILURE_THRESHOLD consecutive failures -> half-open probe after RESET_TIMEOUT"""
+
+    def __init__(self, name: str, failure_threshold: int = FAILURE_THRESHOLD, reset_timeout: float = RESET_TIMEOUT):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+        self.lock = threading.Lock()
+
+    def retry_in(self) -> float:
+        """Seconds until the breaker lets a request through again (0 when closed)"""
+        with self.lock:
+            if self.state == "closed":
+                return 0.0
+            return max(0.0, self.opened_at + self.reset_timeout - time.monotonic())
+
+    def check(self):
+        """Raise BackendUnavailable unless a request may be sent now"""
+        with self.lock:
+            if self.state == "closed":
+                return
+            wait = self.opened_at + self.reset_timeout - time.monotonic()
+            if wait <= 0 and not self.probing:
+                # Half-open: exactly one request finds out whether the backend is back
+                self.state = "half_open"
+                self.probing = True
+                return
+            raise BackendUnavailable(self.name, max(0.0, wait))
+
+    def abandon(self):
+        """A request let through by check() ended without an outcome; allow another probe"""
+        with self.lock:
+            self.probing = False
+
+    def record(self, ok: bool):
+        with self.lock:
+            self.probing = False
+            if ok:
+                self.failures = 0
+                self.state = "closed"
+                return
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state == "closed":
+                    print(f"{self.name} backend unavailable after {self.failures} failures; failing fast for {self.reset_timeout:.0f}s")
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+
+class Backend:
+    """Limiter and breaker guarding every request to one backend"""
+
+    def __init__(self, name: str, initial: int, min_limit: int, max_limit: int):
+        self.name = name
+        self.limiter = AdaptiveLimiter(initial, min_limit, max_limit)
+        self.breaker = CircuitBreaker(name)
+
+    def enter(self):
+        """Fail fast if the breaker is open, otherwise wait for a slot"""
+        self.breaker.check()
+        self.limiter.acquire()
+
+    def exit(self, latency: float, overloaded: bool, failed: bool, endpoint: str = ""):
+        """Report a finished request: overloaded feeds the limit, failed (final outcome only) the breaker"""
+        self.limiter.release(latency, overloaded, endpoint)
+        self.breaker.record(not failed)
+
+    def abandon(self):
+        """Release the slot of a request that was interrupted before it had an outcome"""
+        self.limiter.cancel()
+        self.breaker.abandon()
+
+    def status(self) -> Dict[str, object]:
+        return {
+            "state": self.breaker.state,
+            "retry_in": self.breaker.retry_in(),
+            "limit": int(self.limiter.limit),
+            "in_flight": self.limiter.in_flight,
+        }
+
+
+_backends: Dict[str, Backend] = {}
+_backends_lock = threading.Lock()
+
+
+def get_backend(name: str) -> Backend:
+    """Return the process-wide limiter and breaker for a backend"""
+    with _backends_lock:
+        backend = _backends.get(name)
+        if backend is None:
+            backend = _backends[name] = Backend(name, *BACKEND_LIMITS.get(name, BACKEND_LIMITS["api"]))
+        return backend
+
+
+def register_host(host: str, name: str):
+    """Route requests to host (and its subdomains) through the named backend"""
+    HOST_BACKENDS[host] = name
+
+
+def backend_for_host(host: str) -> Optional[Backend]:
+    for suffix, name in HOST_BACKENDS.items():
+        if host == suffix or host.endswith("." + suffix):
+            return get_backend(name)
+    return None
@@ -1,20 +1,35 @@
 import streamlit as st
+import threading
+import uuid
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 from typing import List
 from app import (
     retrieve_company_documents,
-    upload_and_get_doc_id,
+    acquire_company_documents,
     HybridSearch,
-    download_sec_10k,
-    download_web_annual_report
+    DOCUMENT_SOURCES,
+    stream_outcome
 )
+from cache import get_response_cache
+from jobs import ACTIVE_STATUSES, NO_RESPONSE, get_job_queue, get_worker_pool
+from limiter import get_backend
+from manifest import RunManifest
+from outputs import CUSTOM_CATEGORY, safe_category_name
+from prompt_catalog import PROMPT_SHEETS, load_catalog
+from metrics import run_metrics
+from result_store import get_result_store, new_run_id
 import pandas as pd
-import os
+import time
 
 st.set_page_config(page_title="SWOT Analysis", layout="wide")
 st.title("📊 SWOT Analysis")
 
 # --- Inputs ---
 company_name = st.text_input("Enter Company Name:", "")
+sector = st.text_input(
+    "Sector (optional):", "",
+    help="Market-level web questions listed in sector_prompts.txt are answered once per sector and shared across its companies."
+)
 
 # Initialize session state for doc_ids
 if "doc_ids" not in st.session_state:
@@ -30,7 +45,7 @@ if st.button("🔍 Begin Processing"):
         st.warning("Please enter a company name.")
     else:
         with st.spinner("Checking for documents..."):
-            doc_ids = retrieve_company_documents(company_name)
+            doc_ids = retrieve_company_documents(company_name, acquire=False)
 
             if doc_ids:
                 st.session_state.doc_ids = doc_ids
@@ -41,22 +56,32 @@ if st.button("🔍 Begin Processing"):
             else:
                 st.warning("No existing documents found. Trying to download new ones...")
 
-                sec_path = download_sec_10k(company_name)
-                web_path = download_web_annual_report(company_name)
-
                 uploaded_ids = []
-
-                if sec_path:
-                    doc_id = upload_and_get_doc_id(sec_path)
-                    if doc_id:
-                        uploaded_ids.append(doc_id)
-                        st.success(f"SEC 10-K uploaded with doc_id: {doc_id}")
-
-                if web_path:
-                    doc_id = upload_and_get_doc_id(web_path)
+                labels = {"sec_10k": "SEC 10-K", "web_report": "Web Annual Report"}
+                progress_bars = {}
+                script_ctx = get_script_run_ctx()
+
+                def show_upload_progress(report_type, sent, total):
+                    # Called from upload worker threads, which need the script context to update the page
+                    add_script_run_ctx(threading.current_thread(), script_ctx)
+                    bar = progress_bars.get(report_type)
+                    if bar is None:
+                        return
+                    label = labels.get(report_type, report_type)
+                    bar.progress(
+                        sent / total if total else 1.0,
+                        text=f"Uploading {label}: {sent / 1e6:.1f} / {total / 1e6:.1f} MB"
+                    )
+
+                for report_type in DOCUMENT_SOURCES:
+                    progress_bars[report_type] = st.progress(0.0, text=f"{labels.get(report_type, report_type)}: downloading")
+
+                # Both sources download in parallel; each file is uploaded as soon as it is ready
+                for report_type, path, doc_id in acquire_company_documents(company_name, show_upload_progress):
+                    progress_bars.pop(report_type).empty()
                     if doc_id:
                         uploaded_ids.append(doc_id)
-                        st.success(f"Web Annual Report uploaded with doc_id: {doc_id}")
+                        st.success(f"{labels.get(report_type, report_type)} uploaded with doc_id: {doc_id}")
 
                 if uploaded_ids:
                     st.session_state.doc_ids = uploaded_ids
@@ -69,32 +94,20 @@ if st.button("🔍 Begin Processing"):
 st.divider()
 st.subheader("📁 Generate Analysis based on Categories")
 
-@st.cache_data
-def load_prompts():
-    return pd.read_excel("prompts.xlsx")
+prompt_sheet = st.selectbox(
+    "Prompt sheet:", list(PROMPT_SHEETS),
+    format_func=lambda name: f"{name} ({PROMPT_SHEETS[name]})"
+)
 
-categories = [
-    "Company Overview",
-    "Strengths (Internal Positive Factors)",
-    "Weaknesses (Internal Negative Factors)",
-    "Opportunities (External Positive Factors)",
-    "Threats (External Negative Factors)",
-    "Additional Questions",
-    "ALL"
-]
+# Compiled once per sheet version and shared with batch_runner through .cache/prompt_catalog
+catalog = load_catalog(PROMPT_SHEETS[prompt_sheet])
 
-selected_categories = st.multiselect("Select categories to query:", categories)
+selected_categories = st.multiselect("Select categories to query:", catalog.categories + ["ALL"])
 
 search_option = st.radio("Analysis Type", ("Documents Only", "Web Only", "Hybrid"), key="cat_search_option")
 
-# Load predefined prompts
-prompt_df = load_prompts()
-
-# Filter based on category selection
-if "ALL" in selected_categories:
-    filtered_prompts = prompt_df
-else:
-    filtered_prompts = prompt_df[prompt_df['category'].isin(selected_categories)]
+# (category, prompt) tuples for the selected categories, in sheet order
+selected_prompts = catalog.select(selected_categories)
 
 # --- Custom Questions ---
 st.subheader("💬 Ask Your Own Questions")
@@ -107,106 +120,237 @@ custom_questions = st.text_area(
 custom_questions_list = [q.strip() for q in custom_questions.strip().split('\n') if q.strip()]
 
 # --- Run Analysis ---
+stream_answers = st.checkbox("Stream answers as they are generated", value=False, help="Runs in this page one prompt at a time, showing tokens as they arrive; interacting with the page stops it.")
+batch_requests = st.checkbox("Send each category as one batch request", value=False, help="Posts a category's prompts together to /query/batch.")
+reuse_answers = st.checkbox("Reuse unchanged answers", value=True, help="Skip prompts whose text, mode and documents are unchanged since the last run.")
+bypass_cache = st.checkbox("Bypass response cache", value=False, help="Always query the backend, even for previously answered prompts.")
+
+EXCEL_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# Seconds between refreshes of the job list while jobs are running
+JOB_POLL_SECONDS = 2
+
+# Answers sent to the browser per results page; the rest stay in the result store
+RESULTS_PAGE_SIZE = 20
+
+if "job_ids" not in st.session_state:
+    st.session_state.job_ids = []
+if "owner" not in st.session_state:
+    # Jobs are scheduled fairly per browser session
+    st.session_state.owner = uuid.uuid4().hex
+
+def download_label(category):
+    if category == CUSTOM_CATEGORY:
+        return "📥 Download Custom Questions Responses as Excel"
+    return f"📥 Download '{category}' Responses as Excel"
+
+def section_title(category):
+    return "📝 Custom Questions" if category == CUSTOM_CATEGORY else f"📂 {category}"
+
+@st.cache_data(max_entries=16)
+def export_run_category(company, category, run_id):
+    # Finished runs never change, so each export is built once
+    return get_result_store().export_excel(company, category, run_id)
+
+def show_results(company, run_id, key, finished=True):
+    """Paginated view of a run's answers, read from the result store one page at a time.
+
+    Answers are collapsed; only the selected category's current page is rendered, so the
+    page stays the same size however many prompts the run has.
+    """
+    store = get_result_store()
+    counts = dict(store.category_counts(run_id))
+    if not counts:
+        st.caption("No answers yet.")
+        return
+
+    category_column, page_column = st.columns([3, 1])
+    category = category_column.selectbox(
+        "Category", list(counts), format_func=lambda c: f"{section_title(c)} ({counts[c]})", key=f"{key}-category"
+    )
+    pages = max(1, -(-counts[category] // RESULTS_PAGE_SIZE))
+    page = page_column.number_input("Page", 1, pages, 1, key=f"{key}-page-{category}")
+    offset = (page - 1) * RESULTS_PAGE_SIZE
+
+    for row in store.page(run_id, category, offset, RESULTS_PAGE_SIZE):
+        with st.expander(row["prompt"]):
+            st.markdown(row["answer"])
+            if row["latency"] is None:
+                st.caption("Reused from previous run")
+            elif row["timings"]:
+                st.caption(" · ".join(f"{leg.capitalize()} {seconds:.1f}s" for leg, seconds in row["timings"].items()))
+    st.caption(f"Answers {offset + 1}–{min(offset + RESULTS_PAGE_SIZE, counts[category])} of {counts[category]}")
+
+    if finished:
+        st.download_button(
+            label=download_label(category),
+            data=export_run_category(company, category, run_id),
+            file_name=f"{safe_category_name(category)}.xlsx",
+            mime=EXCEL_MIME,
+            key=f"{key}-download-{category}"
+        )
+
+def show_latency_breakdown(collector):
+    breakdown = pd.DataFrame([
+        {"call": name, **entry} for name, entry in collector.snapshot().items()
+    ])
+    if breakdown.empty:
+        st.write("No backend calls were made.")
+    else:
+        columns = ["call", "calls", "cache_hits", "errors", "p50", "p95", "ttfb_p50", "connect_p50", "bytes"]
+        st.dataframe(breakdown.reindex(columns=columns).fillna(0))
+
+def show_backend_status():
+    status = get_backend("api").status()
+    if status["state"] != "closed":
+        st.warning(
+            f"⚠️ The document backend is unavailable; queries are paused and will resume "
+            f"in about {status['retry_in']:.0f}s. Unanswered prompts are retried automatically."
+        )
+
+def run_streaming(batch, doc_ids):
+    """Answer prompts in this script run, streaming each answer as it is generated.
+
+    Only the answer being generated is on the page; finished answers go to the result
+    store and are browsed afterwards with the paginated results view.
+    """
+    run_stats = run_metrics()
+    search = HybridSearch(use_cache=not bypass_cache, metrics=run_stats)
+
+    # Every answer is appended to the shared result store as soon as it is known
+    store = get_result_store()
+    run_id = new_run_id()
+
+    # Reuse answers whose prompt, mode, doc_ids and web freshness are unchanged
+    manifest = RunManifest(company_name)
+    pending = []
+    for i, (category, prompt) in enumerate(batch):
+        previous = manifest.get(prompt, search_option, doc_ids, sector=sector.strip() or None) if reuse_answers else None
+        if previous is not None:
+            store.append(run_id, company_name, category, prompt, search_option, previous, None, doc_ids, i)
+        else:
+            pending.append(i)
+
+    if len(pending) < len(batch):
+        st.info(f"Reused {len(batch) - len(pending)} unchanged answers; running {len(pending)} prompts.")
+    progress = st.progress(0.0, text="Running queries...")
+    current = st.empty()
+
+    for done, i in enumerate(pending, 1):
+        category, prompt = batch[i]
+        with current.container():
+            st.markdown(f"**{section_title(category)}**")
+            st.markdown(f"**Question:** {prompt}")
+            started = time.perf_counter()
+            outcome, timings = {}, {}
+            streamed = st.write_stream(
+                stream_outcome(search.stream_prompt(prompt, search_option, doc_ids, company_name, timings, sector.strip() or None), outcome)
+            )
+        answer = streamed if isinstance(streamed, str) else "".join(map(str, streamed))
+        store.append(
+            run_id, company_name, category, prompt, search_option,
+            answer or NO_RESPONSE, time.perf_counter() - started, doc_ids, i, timings
+        )
+        # A stream cut off partway is shown but not reused by later runs
+        if outcome.get("complete"):
+            manifest.record(category, prompt, search_option, doc_ids, answer, sector=sector.strip() or None)
+        progress.progress(done / len(pending), text=f"Completed {done}/{len(pending)} queries")
+    current.empty()
+    progress.progress(1.0, text="All queries complete")
+    manifest.save()
+
+    if get_backend("api").status()["state"] != "closed":
+        st.warning("⚠️ The document backend became unavailable during this run. Re-run to retry unanswered prompts.")
+
+    cache_stats = search.cache.stats()
+    st.caption(f"Response cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses, {cache_stats['entries']} entries")
+
+    with st.expander("⏱ Latency breakdown for this run"):
+        show_latency_breakdown(run_stats)
+
+    # Kept in the session so that paging through the results survives reruns
+    st.session_state.streamed_run = {"company": company_name, "mode": search_option, "run_id": run_id}
+
 if st.button("🧠 Run Analysis"):
     if not company_name:
         st.warning("Please enter a company name.")
-    elif filtered_prompts.empty and not custom_questions_list:
+    elif not selected_prompts and not custom_questions_list:
         st.warning("No prompts or custom questions provided.")
     elif not st.session_state.get("doc_ids") and search_option != "Web Only":
         st.warning("Please retrieve or upload documents first.")
     else:
-        with st.spinner("Running queries..."):
-            search = HybridSearch()
-            doc_ids = st.session_state.get("doc_ids", [])
-            os.makedirs("companies", exist_ok=True)
-            os.makedirs(f"companies/{company_name}", exist_ok=True)
-
-            # Predefined Prompt Analysis
-            for category in filtered_prompts['category'].unique():
-                st.subheader(f"📂 {category}")
-                cat_prompts = filtered_prompts[filtered_prompts['category'] == category]
-
-                results = []
-
-                for _, row in cat_prompts.iterrows():
-                    prompt = row['prompts']
-
-                    if search_option == "Documents Only":
-                        response = search.query_documents(prompt, doc_ids)
-                        search_type = "Documents Only"
-                    elif search_option == "Web Only":
-                        response = search.query_web(prompt + f" for {company_name}")
-                        search_type = "Web Only"
-                    else:
-                        response = search.hybrid_search(prompt, prompt + f" for {company_name}", doc_ids)
-                        search_type = "Hybrid"
-
-                    answer = response.get("content", "No response returned.") if isinstance(response, dict) else response or "No response returned."
-
-                    st.markdown(f"**Question:** {prompt}")
-                    st.markdown(f"**Answer:** \n {answer}")
-                    st.markdown("---")
-
-                    results.append({
-                        "Prompt": prompt,
-                        "Response": answer,
-                        "Search Type": search_type
-                    })
-
-                df_results = pd.DataFrame(results)
-                st.markdown(f"**Responses table for '{category}':**")
-                st.dataframe(df_results)
-
-                safe_category = category.replace(" ", "_").replace("(", "").replace(")", "")
-                output_path = f"companies/{company_name}/{company_name}_{safe_category}.xlsx".replace(" ", "_")
-                df_results.to_excel(output_path, index=False)
-
-                if os.path.exists(output_path):
-                    with open(output_path, "rb") as f:
-                        st.download_button(
-                            label=f"📥 Download '{category}' Responses as Excel",
-                            data=f,
-                            file_name=f"{safe_category}.xlsx",
-                            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                        )
-
-            # Custom Question Analysis
-            if custom_questions_list:
-                st.subheader("📝 Custom Questions")
-                custom_results = []
-
-                for prompt in custom_questions_list:
-                    if search_option == "Documents Only":
-                        response = search.query_documents(prompt, doc_ids)
-                        search_type = "Documents Only"
-                    elif search_option == "Web Only":
-                        response = search.query_web(prompt + f" for {company_name}")
-                        search_type = "Web Only"
-                    else:
-                        response = search.hybrid_search(prompt, prompt + f" for {company_name}", doc_ids)
-                        search_type = "Hybrid"
-
-                    answer = response.get("content", "No response returned.") if isinstance(response, dict) else response or "No response returned."
-
-                    st.markdown(f"**Question:** {prompt}")
-                    st.markdown(f"**Answer:** \n{answer}")
-                    st.markdown("---")
-
-                    custom_results.append({
-                        "Prompt": prompt,
-                        "Response": answer,
-                        "Search Type": search_type
-                    })
-
-                df_custom = pd.DataFrame(custom_results)
-                output_custom_path = f"companies/{company_name}/{company_name}_Custom_Questions.xlsx".replace(" ", "_")
-                df_custom.to_excel(output_custom_path, index=False)
-
-                if os.path.exists(output_custom_path):
-                    with open(output_custom_path, "rb") as f:
-                        st.download_button(
-                            label=f"📥 Download Custom Questions Responses as Excel",
-                            data=f,
-                            file_name="Custom_Questions.xlsx",
-                            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                        )
+        doc_ids = st.session_state.get("doc_ids", [])
+        # Flatten predefined and custom prompts into one batch so categories share the pool
+        batch = list(selected_prompts)
+        batch += [(CUSTOM_CATEGORY, prompt) for prompt in custom_questions_list]
+
+        if stream_answers:
+            with st.spinner("Running queries..."):
+                run_streaming(batch, doc_ids)
+        else:
+            # Queued for the shared worker pool; the page only polls, so reruns do not stop the run
+            job_id = get_worker_pool().submit(
+                company_name, search_option, batch, doc_ids,
+                sector=sector.strip() or None,
+                use_cache=not bypass_cache,
+                reuse=reuse_answers,
+                batch=batch_requests,
+                owner=st.session_state.owner
+            )
+            st.session_state.job_ids.append(job_id)
+            st.success(f"Queued {len(batch)} prompts for {company_name}. Answers appear below as they finish.")
+
+# --- Streamed Run Results ---
+if "streamed_run" in st.session_state:
+    streamed_run = st.session_state.streamed_run
+    st.divider()
+    st.subheader(f"📄 {streamed_run['company']} · {streamed_run['mode']} (streamed)")
+    show_results(streamed_run["company"], streamed_run["run_id"], key=f"stream-{streamed_run['run_id']}")
+
+def render_job(job_id):
+    queue = get_job_queue()
+    job = queue.job(job_id)
+    if job is None:
+        return
+    active = job["status"] in ACTIVE_STATUSES
+
+    with st.container(border=True):
+        st.markdown(f"#### {job['company']} · {job['mode']} · {job['status']}")
+        caption = f"{job['completed']}/{job['total']} prompts answered"
+        if job["reused"]:
+            caption += f" ({job['reused']} reused from the previous run)"
+        st.progress(job["completed"] / job["total"] if job["total"] else 1.0, text=caption)
+        waiting = queue.waiting(job_id) if active else 0
+        if waiting:
+            st.caption(f"{waiting} failed prompts will be retried automatically")
+        if active and st.button("Cancel", key=f"cancel-{job_id}"):
+            queue.cancel(job_id)
+
+        show_results(job["company"], job["run_id"], key=f"job-{job_id}", finished=not active)
+
+def jobs_active():
+    queue = get_job_queue()
+    return any((queue.job(job_id) or {}).get("status") in ACTIVE_STATUSES for job_id in st.session_state.job_ids)
+
+# --- Analysis Jobs ---
+if st.session_state.job_ids:
+    st.divider()
+    st.subheader("🗂 Analysis Jobs")
+    polling = jobs_active()
+
+    @st.fragment(run_every=JOB_POLL_SECONDS if polling else None)
+    def show_jobs():
+        show_backend_status()
+        for job_id in reversed(st.session_state.job_ids):
+            render_job(job_id)
+
+        cache_stats = get_response_cache().stats()
+        st.caption(f"Response cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses, {cache_stats['entries']} entries")
+        with st.expander("⏱ Latency breakdown (shared worker pool)"):
+            show_latency_breakdown(get_worker_pool().metrics)
+
+        if polling and not jobs_active():
+            # Everything finished: rerun the page once so that polling stops
+            st.rerun()
+
+    show_jobs()
@@ -0,0 +1,94 @@
+"""Per-company run manifest used to skip prompts whose inputs have not changed"""
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+from outputs import OUTPUT_DIR
+from prompt_catalog import is_sector_level
+
+# Answers that include web research are re-run once they are older than this
+WEB_FRESHNESS_WINDOW = 7 * 24 * 3600
+
+# One lock per manifest file, held while it is re-read, merged and written
+_file_locks: Dict[str, threading.Lock] = {}
+_file_locks_lock = threading.Lock()
+
+
+def _file_lock(path: str) -> threading.Lock:
+    with _file_locks_lock:
+        return _file_locks.setdefault(os.path.abspath(path), threading.Lock())
+
+
+def _read_entries(path: str) -> Dict[str, Dict]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f).get("entries", {})
+    except (OSError, ValueError):
+        return {}
+
+
+def fingerprint(prompt: str, mode: str, doc_ids: List[str] = None, domain: str = None, sector: str = None) -> str:
+    """Hash of everything that determines an answer apart from time"""
+    payload = {
+        "prompt": prompt.strip(),
+        "mode": mode,
+        # Web-only answers do not depend on the company's documents
+        "doc_ids": sorted(doc_ids or []) if mode != "Web Only" else [],
+        "domain": domain
+    }
+    # Only allow-listed prompts are searched per sector; leaving the key out otherwise keeps older entries valid
+    if sector and not domain and mode != "Documents Only" and is_sector_level(prompt):
+        payload["sector"] = sector
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class RunManifest:
+    """Fingerprint -> previous answer for one company, stored in companies/<name>/manifest.json"""
+
+    def __init__(self, company_name: str, freshness_window: int = WEB_FRESHNESS_WINDOW):
+        self.path = f"{OUTPUT_DIR}/{company_name}/manifest.json".replace(" ", "_")
+        self.freshness_window = freshness_window
+        self.lock = threading.Lock()
+        self.entries: Dict[str, Dict] = _read_entries(self.path)
+        # Entries recorded since loading; save() merges only these into the file
+        self.changed: Dict[str, Dict] = {}
+
+    def get(self, prompt: str, mode: str, doc_ids: List[str] = None, domain: str = None, sector: str = None) -> Optional[str]:
+        """Previous answer if prompt, mode, doc_ids, domain and sector match and web data is still fresh"""
+        entry = self.entries.get(fingerprint(prompt, mode, doc_ids, domain, sector))
+        if entry is None:
+            return None
+        if mode != "Documents Only" and time.time() - entry["updated_at"] > self.freshness_window:
+            return None
+        return entry["answer"]
+
+    def record(
+        self, category: str, prompt: str, mode: str, doc_ids: List[str], answer: str, domain: str = None, sector: str = None
+    ):
+        if not answer:
+            return
+        key = fingerprint(prompt, mode, doc_ids, domain, sector)
+        entry = {
+            "category": category,
+            "prompt": prompt,
+            "mode": mode,
+            "answer": answer,
+            "updated_at": time.time()
+        }
+        with self.lock:
+            self.entries[key] = self.changed[key] = entry
+
+    def save(self):
+        """Merge this manifest's new entries into the file, keeping entries saved by other runs since it was loaded"""
+        with self.lock, _file_lock(self.path):
+            entries = _read_entries(self.path)
+            entries.update(self.changed)
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"entries": entries}, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+            self.entries, self.changed = entries, {}
@@ -0,0 +1,201 @@
+"""In-process latency, size and error metrics for backend, SEC and download calls"""
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Any, Dict, List, Optional
+
+# Samples kept per (kind, label) for percentile estimates
+MAX_SAMPLES = 5000
+
+# Optional JSON-lines log of every call and Prometheus port, enabled by environment
+METRICS_LOG = os.environ.get("METRICS_LOG")
+METRICS_PORT = os.environ.get("METRICS_PORT")
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class Metrics:
+    """Per-call timings grouped by kind (query, upload, download, sec) and label (e.g. search_type)"""
+
+    def __init__(self, log_path: str = METRICS_LOG, parent: "Metrics" = None):
+        self.lock = threading.Lock()
+        self.log_path = log_path
+        # A per-run collector forwards every sample to the process-wide one
+        self.parent = parent
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.samples = defaultdict(lambda: {
+                "total": deque(maxlen=MAX_SAMPLES),
+                "ttfb": deque(maxlen=MAX_SAMPLES),
+                "connect": deque(maxlen=MAX_SAMPLES)
+            })
+            self.counters = defaultdict(lambda: defaultdict(int))
+
+    def record(
+        self,
+        kind: str,
+        label: str,
+        seconds: float,
+        ttfb: float = None,
+        connect: float = None,
+        response_bytes: int = 0,
+        retries: int = 0,
+        cache_hit: bool = False,
+        error: str = None
+    ):
+        if self.parent is not None:
+            self.parent.record(kind, label, seconds, ttfb, connect, response_bytes, retries, cache_hit, error)
+
+        key = (kind, label or "unknown")
+        with self.lock:
+            counters = self.counters[key]
+            counters["calls"] += 1
+            counters["bytes"] += response_bytes
+            counters["retries"] += retries
+            if cache_hit:
+                counters["cache_hits"] += 1
+            if error:
+                counters["errors"] += 1
+                counters[f"error:{error}"] += 1
+
+            # Cache hits would drag percentiles toward zero, so they are only counted
+            if not cache_hit:
+                samples = self.samples[key]
+                samples["total"].append(seconds)
+                if ttfb is not None:
+                    samples["ttfb"].append(ttfb)
+                if connect is not None:
+                    samples["connect"].append(connect)
+
+        if self.log_path:
+            event = {
+                "ts": time.time(), "kind": kind, "label": key[1], "seconds": round(seconds, 4),
+                "ttfb": ttfb, "connect": connect, "bytes": response_bytes, "retries": retries,
+                "cache_hit": cache_hit, "error": error
+            }
+            with self.lock, open(self.log_path, "a") as f:
+                f.write(json.dumps(event) + "\n")
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Counters and p50/p95 latencies per kind/label"""
+        with self.lock:
+            keys = set(self.counters) | set(self.samples)
+            snapshot = {}
+            for kind, label in sorted(keys):
+                samples = self.samples[(kind, label)]
+                total = list(samples["total"])
+                entry = dict(self.counters[(kind, label)])
+                entry.update({
+                    "p50": percentile(total, 50),
+                    "p95": percentile(total, 95),
+                    "ttfb_p50": percentile(list(samples["ttfb"]), 50),
+                    "connect_p50": percentile(list(samples["connect"]), 50),
+                    "mean": sum(total) / len(total) if total else None
+                })
+                snapshot[f"{kind}/{label}"] = entry
+        return snapshot
+
+    def to_prometheus(self) -> str:
+        """Prometheus text exposition of the current snapshot"""
+        lines = []
+        for name, entry in self.snapshot().items():
+            kind, label = name.split("/", 1)
+            tags = f'kind="{kind}",label="{label}"'
+            lines.append(f"swot_calls_total{{{tags}}} {entry.get('calls', 0)}")
+            lines.append(f"swot_errors_total{{{tags}}} {entry.get('errors', 0)}")
+            lines.append(f"swot_cache_hits_total{{{tags}}} {entry.get('cache_hits', 0)}")
+            lines.append(f"swot_response_bytes_total{{{tags}}} {entry.get('bytes', 0)}")
+            lines.append(f"swot_retries_total{{{tags}}} {entry.get('retries', 0)}")
+            for quantile, field in (("0.5", "p50"), ("0.95", "p95")):
+                if entry[field] is not None:
+                    lines.append(f'swot_latency_seconds{{{tags},quantile="{quantile}"}} {entry[field]:.6f}')
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+def run_metrics() -> Metrics:
+    """Fresh collector for one run that also feeds the process-wide metrics"""
+    return Metrics(log_path=None, parent=metrics)
+
+
+def record_call(
+    kind: str,
+    label: str,
+    started: float,
+    response=None,
+    response_bytes: int = None,
+    cache_hit: bool = False,
+    error: str = None,
+    collector: Metrics = None
+):
+    """Record one HTTP call timed from `started` (time.perf_counter) using PooledSession response details"""
+    ttfb = connect = None
+    retries = 0
+    if response is not None:
+        ttfb = response.elapsed.total_seconds()
+        connect = getattr(response, "connect_seconds", None)
+        retries = getattr(response, "retry_count", 0)
+        # Streamed bodies are not read here; callers pass the byte count they consumed
+        if response_bytes is None and getattr(response, "_content_consumed", False):
+            response_bytes = len(response.content or b"")
+    (collector or metrics).record(
+        kind, label, time.perf_counter() - started,
+        ttfb=ttfb, connect=connect, response_bytes=response_bytes or 0,
+        retries=retries, cache_hit=cache_hit, error=error
+    )
+
+
+def error_class(e: Exception) -> str:
+    response = getattr(e, "response", None)
+    if response is not None:
+        return f"http_{response.status_code}"
+    return type(e).__name__
+
+
+_server = None
+
+
+def start_metrics_server(port: int):
+    """Serve /metrics (Prometheus text) and /metrics.json from a daemon thread, once per process"""
+    # http.server is only imported when the endpoint is enabled, keeping `import metrics` cheap
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/metrics.json":
+                body, content_type = json.dumps(metrics.snapshot()).encode(), "application/json"
+            else:
+                body, content_type = metrics.to_prometheus().encode(), "text/plain; version=0.0.4"
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    global _server
+    if _server is None:
+        _server = ThreadingHTTPServer(("0.0.0.0", port), MetricsHandler)
+        threading.Thread(target=_server.serve_forever, daemon=True).start()
+    return _server
+
+
+if METRICS_PORT:
+    try:
+        start_metrics_server(int(METRICS_PORT))
+    except OSError as e:
+        print(f"Metrics server not started: {e}")
@@ -0,0 +1,27 @@
+"""Per-company, per-category result files shared by the UI and headless runs"""
+import os
+from typing import Dict, List
+
+OUTPUT_DIR = "companies"
+CUSTOM_CATEGORY = "Custom Questions"
+
+
+def safe_category_name(category: str) -> str:
+    if category == CUSTOM_CATEGORY:
+        return "Custom_Questions"
+    return category.replace(" ", "_").replace("(", "").replace(")", "")
+
+
+def category_output_path(company_name: str, category: str) -> str:
+    return f"{OUTPUT_DIR}/{company_name}/{company_name}_{safe_category_name(category)}.xlsx".replace(" ", "_")
+
+
+def write_category_results(company_name: str, category: str, rows: List[Dict[str, str]]) -> str:
+    """Write one category's Prompt/Response/Search Type rows to its Excel file"""
+    # pandas is imported here so that importing OUTPUT_DIR (e.g. via app -> manifest) stays cheap
+    import pandas as pd
+
+    output_path = category_output_path(company_name, category)
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    pd.DataFrame(rows).to_excel(output_path, index=False)
+    return output_path
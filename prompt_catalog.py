@@ -0,0 +1,173 @@
+"""Prompt sheets compiled once into a cached catalog with per-category indexes"""
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from uploads import file_sha256
+
+CATALOG_DIR = os.path.join(".cache", "prompt_catalog")
+
+# Bump when the compiled layout changes so stale catalogs are rebuilt
+CATALOG_FORMAT = 1
+
+# Sheets selectable in the UI and by batch_runner --prompts
+PROMPT_SHEETS = {
+    "Standard": "prompts.xlsx",
+    "Final": "prompts_final.xlsx",
+}
+DEFAULT_SHEET = "prompts.xlsx"
+
+# Prompts answered once per sector instead of once per company, one per line
+SECTOR_PROMPTS_PATH = "sector_prompts.txt"
+
+# (category, prompt)
+PromptRow = Tuple[str, str]
+
+
+def _clean(value) -> str:
+    # Empty cells come back from pandas as NaN
+    return value.strip() if isinstance(value, str) else ""
+
+
+def compile_sheet(path: str) -> List[Tuple[str, str, str]]:
+    """(category, sub-category, prompt) rows of a prompt sheet, in sheet order"""
+    import pandas as pd
+
+    df = pd.read_excel(path, dtype=str)
+    rows = []
+    for category, sub_category, prompt in zip(df["category"], df.get("sub-category", [None] * len(df)), df["prompts"]):
+        if _clean(prompt) and _clean(category):
+            rows.append((_clean(category), _clean(sub_category), _clean(prompt)))
+    return rows
+
+
+class PromptCatalog:
+    """Compiled prompt sheet: rows as tuples, indexed by category, versioned by sheet hash"""
+
+    def __init__(self, source: str, version: str, rows: Iterable[Tuple[str, str, str]]):
+        rows = list(rows)
+        self.source = source
+        self.version = version
+        self.rows: Tuple[PromptRow, ...] = tuple((category, prompt) for category, _, prompt in rows)
+        by_category: Dict[str, List[PromptRow]] = {}
+        for row in self.rows:
+            by_category.setdefault(row[0], []).append(row)
+        self.by_category: Dict[str, Tuple[PromptRow, ...]] = {
+            category: tuple(category_rows) for category, category_rows in by_category.items()
+        }
+
+    @property
+    def categories(self) -> List[str]:
+        """Categories in the order they first appear in the sheet"""
+        return list(self.by_category)
+
+    def select(self, categories: Iterable[str] = None) -> List[PromptRow]:
+        """Rows of the given categories, grouped in sheet order; all rows when categories is None or includes ALL"""
+        if categories is None:
+            return list(self.rows)
+        categories = set(categories)
+        if "ALL" in categories:
+            return list(self.rows)
+        return [row for category in self.by_category if category in categories for row in self.by_category[category]]
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+
+class CatalogCache:
+    """Compiled catalogs kept in memory and under .cache/prompt_catalog, rebuilt when the sheet changes.
+
+    A sheet whose mtime and size are unchanged is not read at all; one that was touched
+    but has the same content hash reuses the compiled rows.
+    """
+
+    def __init__(self, directory: str = CATALOG_DIR):
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.loaded: Dict[str, Tuple[Tuple[float, int], PromptCatalog]] = {}
+
+    def _compiled_path(self, path: str) -> str:
+        name = hashlib.sha256(os.path.abspath(path).encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.directory, f"{os.path.basename(path)}.{name}.json")
+
+    def _read_compiled(self, path: str) -> Optional[Dict]:
+        try:
+            with open(self._compiled_path(path), encoding="utf-8") as f:
+                compiled = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return compiled if compiled.get("format") == CATALOG_FORMAT else None
+
+    def _write_compiled(self, path: str, compiled: Dict):
+        os.makedirs(self.directory, exist_ok=True)
+        compiled_path = self._compiled_path(path)
+        tmp_path = compiled_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(compiled, f, ensure_ascii=False)
+        os.replace(tmp_path, compiled_path)
+
+    def load(self, path: str = DEFAULT_SHEET) -> PromptCatalog:
+        stat = os.stat(path)
+        signature = (stat.st_mtime, stat.st_size)
+        with self.lock:
+            cached = self.loaded.get(path)
+            if cached is not None and cached[0] == signature:
+                return cached[1]
+
+            compiled = self._read_compiled(path)
+            if compiled is None or (compiled["mtime"], compiled["size"]) != signature:
+                digest = file_sha256(path)
+                if compiled is None or compiled["sha256"] != digest:
+                    print(f"Compiling prompt catalog from {path}")
+                    compiled = {"format": CATALOG_FORMAT, "sha256": digest, "rows": compile_sheet(path)}
+                compiled.update({"source": path, "mtime": stat.st_mtime, "size": stat.st_size})
+                self._write_compiled(path, compiled)
+
+            catalog = PromptCatalog(path, compiled["sha256"][:12], [tuple(row) for row in compiled["rows"]])
+            self.loaded[path] = (signature, catalog)
+            return catalog
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_catalog_cache() -> CatalogCache:
+    """Return the process-wide catalog cache"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = CatalogCache()
+        return _default_cache
+
+
+def load_catalog(path: str = DEFAULT_SHEET) -> PromptCatalog:
+    """Compiled catalog for a prompt sheet; only re-reads the sheet when it has changed"""
+    return get_catalog_cache().load(path)
+
+
+_sector_prompts: Dict[str, Tuple[float, FrozenSet[str]]] = {}
+_sector_prompts_lock = threading.Lock()
+
+
+def load_sector_prompts(path: str = SECTOR_PROMPTS_PATH) -> FrozenSet[str]:
+    """Prompts listed in the sector allow-list; re-read only when the file changes"""
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        return frozenset()
+    with _sector_prompts_lock:
+        cached = _sector_prompts.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        with open(path, encoding="utf-8") as f:
+            prompts = frozenset(line.strip() for line in f if line.strip() and not line.lstrip().startswith("#"))
+        _sector_prompts[path] = (mtime, prompts)
+        return prompts
+
+
+def is_sector_level(prompt: str) -> bool:
+    """True for market-level prompts whose answer does not depend on the company"""
+    return prompt.strip() in load_sector_prompts()
@@ -0,0 +1,224 @@
+"""Cached discovery of annual-report PDF URLs from web search results"""
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from typing import Callable, Dict, Iterable, List, Optional
+from urllib.parse import urlparse
+
+from metrics import error_class, record_call
+from transport import get_session
+
+DISCOVERY_DIR = ".cache"
+DISCOVERY_PATH = os.path.join(DISCOVERY_DIR, "report_discovery.json")
+
+# How long search results are reused before searching again; companies with no
+# usable result are retried sooner
+DISCOVERY_TTL = 30 * 24 * 3600
+EMPTY_RESULT_TTL = 24 * 3600
+
+# Number of top-scored candidates validated with concurrent HEAD requests
+PROBE_COUNT = 5
+PROBE_TIMEOUT = (5, 10)
+
+# Servers that refuse HEAD; their candidates are kept but ranked after verified ones
+HEAD_UNSUPPORTED = (403, 405, 501)
+
+# A candidate that keeps failing transiently (timeouts, 429, 5xx) is dropped after this many
+# failures; failures older than TRANSIENT_FAILURE_TTL are forgotten
+TRANSIENT_FAILURE_LIMIT = 3
+TRANSIENT_FAILURE_TTL = 24 * 3600
+
+_YEAR_RE = re.compile(r"(?<!\d)(19|20)\d{2}(?!\d)")
+
+
+def is_transient_status(status: Optional[int]) -> bool:
+    """True for statuses worth retrying later: throttling, timeouts and server errors"""
+    return status is None or status in (408, 429) or status >= 500
+
+
+def normalize_company_name(name: str) -> str:
+    return re.sub(r"[^a-zA-Z0-9]", "", name).lower()
+
+
+def report_years(today: date = None) -> List[int]:
+    """Fiscal years a current annual report may be labelled with, newest first"""
+    year = (today or date.today()).year
+    # Reports for the fiscal year just closed are published during the current year
+    return [year, year - 1]
+
+
+def score_url(url: str, norm_name: str, years: List[int]) -> int:
+    lower = url.lower()
+    score = 0
+
+    if "annual" in lower:
+        score += 2
+
+    domain = urlparse(url).netloc
+    if norm_name in normalize_company_name(domain):
+        score += 3
+
+    for rank, year in enumerate(years):
+        if str(year) in lower or f"fy{year % 100:02d}" in lower:
+            score += len(years) - rank
+            break
+    else:
+        if _YEAR_RE.search(lower):
+            # Labelled with an older year: probably an archived report
+            score -= 1
+
+    return score
+
+
+class ReportDiscovery:
+    """Ranks, validates and caches annual-report candidates per normalized company name"""
+
+    def __init__(
+        self,
+        search: Callable[..., Iterable[str]],
+        headers: Dict[str, str],
+        min_bytes: int = 0,
+        max_bytes: int = None,
+        path: str = DISCOVERY_PATH
+    ):
+        self.search = search
+        self.headers = headers
+        self.min_bytes = min_bytes
+        self.max_bytes = max_bytes
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries: Dict[str, Dict] = {}
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.entries, f)
+        os.replace(tmp_path, self.path)
+
+    def probe(self, url: str) -> Optional[bool]:
+        """HEAD check of a candidate: True if it looks like a PDF within size limits, None if unknown.
+
+        Transient failures are unknown rather than False, so they do not remove the candidate.
+        """
+        started = time.perf_counter()
+        response = None
+        try:
+            response = get_session().head(url, headers=self.headers, allow_redirects=True, timeout=PROBE_TIMEOUT)
+            record_call("download", "probe", started, response, response_bytes=0)
+        except Exception as e:
+            record_call("download", "probe", started, response, response_bytes=0, error=error_class(e))
+            return None
+
+        if response.status_code in HEAD_UNSUPPORTED or is_transient_status(response.status_code):
+            return None
+        if not response.ok:
+            return False
+        content_type = response.headers.get("Content-Type", "").lower()
+        if content_type and not any(t in content_type for t in ("pdf", "octet-stream")):
+            return False
+        length = int(response.headers.get("Content-Length") or 0)
+        if length and (length < self.min_bytes or (self.max_bytes and length > self.max_bytes)):
+            return False
+        return True
+
+    def _discover(self, company_name: str, max_results: int) -> List[str]:
+        query = f'"{company_name}" "annual report" filetype:pdf'
+        print(f"Searching Google for: {query}")
+        results = list(self.search(query, num_results=max_results))
+
+        norm_name = normalize_company_name(company_name)
+        years = report_years()
+        scored = [
+            (score_url(url, norm_name, years), url) for url in dict.fromkeys(results)
+            if urlparse(url).path.lower().endswith(".pdf")
+        ]
+        ranked = [url for _, url in sorted(scored, key=lambda item: item[0], reverse=True)]
+
+        top = ranked[:PROBE_COUNT]
+        with ThreadPoolExecutor(max_workers=max(1, len(top))) as executor:
+            verdicts = list(executor.map(self.probe, top))
+
+        verified = [url for url, ok in zip(top, verdicts) if ok]
+        unverified = [url for url, ok in zip(top, verdicts) if ok is None]
+        return verified + unverified + ranked[PROBE_COUNT:]
+
+    def candidates(self, company_name: str, max_results: int = 20) -> List[str]:
+        """Candidate PDF URLs for a company, best first; searches only when the cached entry is stale"""
+        key = normalize_company_name(company_name)
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry is not None:
+            ttl = DISCOVERY_TTL if entry["urls"] else EMPTY_RESULT_TTL
+            if time.time() - entry["searched_at"] < ttl:
+                return list(entry["urls"])
+
+        try:
+            urls = self._discover(company_name, max_results)
+        except Exception as e:
+            print(f"Annual report search failed: {str(e)}")
+            return list(entry["urls"]) if entry else []
+
+        with self.lock:
+            self.entries[key] = {"urls": urls, "searched_at": time.time()}
+            self._save()
+        return urls
+
+    def mark_failed(self, company_name: str, url: str, permanent: bool = True):
+        """Record a candidate that could not be downloaded.
+
+        Permanent failures (4xx, not a PDF, wrong size) drop it at once. Transient ones move it
+        to the back and drop it only after TRANSIENT_FAILURE_LIMIT failures within TRANSIENT_FAILURE_TTL.
+        """
+        key = normalize_company_name(company_name)
+        with self.lock:
+            entry = self.entries.get(key)
+            if not entry or url not in entry["urls"]:
+                return
+            entry["urls"].remove(url)
+            failures = entry.setdefault("failures", {})
+            previous = failures.pop(url, None)
+            if not permanent:
+                count = 1
+                if previous and time.time() - previous["at"] < TRANSIENT_FAILURE_TTL:
+                    count = previous["count"] + 1
+                if count < TRANSIENT_FAILURE_LIMIT:
+                    failures[url] = {"count": count, "at": time.time()}
+                    entry["urls"].append(url)
+            self._save()
+
+    def mark_succeeded(self, company_name: str, url: str):
+        """Move a candidate that downloaded successfully to the front"""
+        key = normalize_company_name(company_name)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and url in entry["urls"]:
+                entry["urls"].remove(url)
+                entry["urls"].insert(0, url)
+                entry.get("failures", {}).pop(url, None)
+                self._save()
+
+
+_default_discovery = None
+_default_discovery_lock = threading.Lock()
+
+
+def get_report_discovery(search: Callable[..., Iterable[str]], headers: Dict[str, str], **kwargs) -> ReportDiscovery:
+    """Return the process-wide report discovery cache"""
+    global _default_discovery
+    with _default_discovery_lock:
+        if _default_discovery is None:
+            _default_discovery = ReportDiscovery(search, headers, **kwargs)
+        return _default_discovery
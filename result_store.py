@@ -0,0 +1,159 @@
+"""Single SQLite store for analysis answers across companies and runs"""
+import io
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from outputs import OUTPUT_DIR
+
+STORE_PATH = os.path.join(OUTPUT_DIR, "results.sqlite")
+
+# Column names used in the per-category Excel exports
+EXPORT_COLUMNS = {"prompt": "Prompt", "answer": "Response", "mode": "Search Type"}
+
+
+def new_run_id() -> str:
+    return uuid.uuid4().hex
+
+
+class ResultStore:
+    """Append-only table of (company, category, prompt, mode, answer, latency, timings, timestamp, doc_ids)"""
+
+    def __init__(self, path: str = STORE_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS results (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                run_id TEXT,
+                position INTEGER,
+                company TEXT,
+                category TEXT,
+                prompt TEXT,
+                mode TEXT,
+                answer TEXT,
+                latency REAL,
+                timestamp REAL,
+                doc_ids TEXT,
+                timings TEXT
+            )"""
+        )
+        # Stores created before per-leg timings were kept
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(results)")}
+        if "timings" not in columns:
+            self.conn.execute("ALTER TABLE results ADD COLUMN timings TEXT")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_results_company ON results(company, category, timestamp)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_results_run ON results(run_id)")
+        self.conn.commit()
+
+    def append(
+        self,
+        run_id: str,
+        company: str,
+        category: str,
+        prompt: str,
+        mode: str,
+        answer: str,
+        latency: float = None,
+        doc_ids: List[str] = None,
+        position: int = None,
+        timings: Dict[str, float] = None
+    ):
+        """Add one answer; position is the prompt's index within its run, used to keep sheet order.
+
+        timings holds seconds per leg ("documents", "web", "synthesis") for answers that were run.
+        """
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO results (run_id, position, company, category, prompt, mode, answer, latency, timestamp, "
+                "doc_ids, timings) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (run_id, position, company, category, prompt, mode, answer, latency, time.time(),
+                 json.dumps(sorted(doc_ids or [])), json.dumps(timings) if timings else None)
+            )
+            self.conn.commit()
+
+    def query(self, sql: str, params: tuple = ()) -> pd.DataFrame:
+        """Run an arbitrary read query, e.g. for cross-company comparisons"""
+        with self.lock:
+            return pd.read_sql_query(sql, self.conn, params=params)
+
+    def results(self, company: str = None, category: str = None, run_id: str = None) -> pd.DataFrame:
+        """Rows matching the given filters in run order"""
+        clauses, params = [], []
+        for column, value in (("company", company), ("category", category), ("run_id", run_id)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        return self.query(f"SELECT * FROM results {where} ORDER BY run_id, position, id", tuple(params))
+
+    def latest(self, company: str, category: str = None) -> pd.DataFrame:
+        """Most recent answer per (category, prompt, mode) for a company"""
+        sql = (
+            "SELECT * FROM results WHERE id IN ("
+            "SELECT MAX(id) FROM results WHERE company = ? GROUP BY category, prompt, mode"
+            ")"
+        )
+        params: tuple = (company,)
+        if category is not None:
+            sql += " AND category = ?"
+            params += (category,)
+        return self.query(sql + " ORDER BY id", params)
+
+    def category_counts(self, run_id: str) -> List[Tuple[str, int]]:
+        """(category, answers) for a run, in prompt order"""
+        with self.lock:
+            return self.conn.execute(
+                "SELECT category, COUNT(*) FROM results WHERE run_id = ? GROUP BY category ORDER BY MIN(position)",
+                (run_id,)
+            ).fetchall()
+
+    def page(self, run_id: str, category: str, offset: int, limit: int) -> List[Dict[str, Any]]:
+        """One page of a run's answers for a category, in prompt order, without loading the rest"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT prompt, answer, latency, timings FROM results WHERE run_id = ? AND category = ? "
+                "ORDER BY position, id LIMIT ? OFFSET ?",
+                (run_id, category, limit, offset)
+            ).fetchall()
+        return [
+            {"prompt": prompt, "answer": answer, "latency": latency, "timings": json.loads(timings) if timings else None}
+            for prompt, answer, latency, timings in rows
+        ]
+
+    def export_excel(self, company: str, category: str, run_id: Optional[str] = None) -> bytes:
+        """Build a category's Excel export in memory"""
+        if run_id is not None:
+            df = self.results(company, category, run_id)
+        else:
+            df = self.latest(company, category)
+        buffer = io.BytesIO()
+        df[list(EXPORT_COLUMNS)].rename(columns=EXPORT_COLUMNS).to_excel(buffer, index=False)
+        return buffer.getvalue()
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            rows, companies = self.conn.execute("SELECT COUNT(*), COUNT(DISTINCT company) FROM results").fetchone()
+        return {"rows": rows, "companies": companies}
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_result_store() -> ResultStore:
+    """Return the process-wide result store"""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = ResultStore()
+        return _default_store
@@ -0,0 +1,171 @@
+"""10-K ingestion helpers: section extraction and HTML-to-text/PDF conversion in isolated processes"""
+import multiprocessing
+import os
+import queue as queue_module
+import re
+import sys
+import time
+from html.parser import HTMLParser
+from typing import Callable, Dict, List, Tuple
+
+# Sections uploaded in text mode: business, risk factors, MD&A, market risk, financials
+TEN_K_ITEMS = ["1", "1A", "7", "7A", "8"]
+
+# Limits for the WeasyPrint subprocess
+PDF_MAX_MEMORY_MB = 2048
+PDF_TIMEOUT = 300
+
+# Limits for the text-extraction subprocess
+TEXT_MAX_MEMORY_MB = 1024
+TEXT_TIMEOUT = 120
+
+_BLOCK_TAGS = {"p", "div", "br", "tr", "li", "h1", "h2", "h3", "h4", "h5", "h6", "table", "section"}
+_SKIP_TAGS = {"script", "style", "head", "title"}
+_ITEM_RE = re.compile(r"^\s*item\s*(\d{1,2}[a-c]?)\s*[\.:\-–—]?", re.IGNORECASE | re.MULTILINE)
+
+
+class _TextExtractor(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: List[str] = []
+        self.skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _SKIP_TAGS:
+            self.skip_depth += 1
+        elif tag in _BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in _SKIP_TAGS and self.skip_depth:
+            self.skip_depth -= 1
+        elif tag in _BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        if not self.skip_depth:
+            self.parts.append(data)
+
+
+def html_to_text(html: str) -> str:
+    """Plain text of an EDGAR HTML filing with block structure kept as line breaks"""
+    parser = _TextExtractor()
+    parser.feed(html)
+    parser.close()
+    text = "".join(parser.parts).replace("\xa0", " ")
+    lines = (re.sub(r"[ \t]+", " ", line).strip() for line in text.splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def extract_10k_sections(text: str, items: List[str] = TEN_K_ITEMS) -> Dict[str, str]:
+    """Split 10-K text into Item sections, keeping the longest span per item.
+
+    Items appear twice (table of contents and body); the body occurrence is the long one.
+    """
+    matches = list(_ITEM_RE.finditer(text))
+    wanted = {item.upper() for item in items}
+    sections: Dict[str, str] = {}
+    for i, match in enumerate(matches):
+        item = match.group(1).upper()
+        if item not in wanted:
+            continue
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        body = text[match.start():end].strip()
+        if len(body) > len(sections.get(item, "")):
+            sections[item] = body
+    return {item.upper(): sections[item.upper()] for item in items if item.upper() in sections}
+
+
+def _write_text(html: str, path: str) -> Dict[str, float]:
+    text = html_to_text(html)
+    sections = extract_10k_sections(text)
+    # Fall back to the full text when the filing doesn't use standard Item headings
+    body = "\n\n".join(sections.values()) if sections else text
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(body)
+    return {"sections": len(sections)}
+
+
+def _write_pdf(html: str, base_url: str, pdf_path: str) -> Dict[str, float]:
+    from weasyprint import HTML
+    HTML(string=html, base_url=base_url).write_pdf(pdf_path)
+    return {}
+
+
+def _maxrss_mb() -> float:
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS and kilobytes elsewhere
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def _run_child(work: Callable[..., Dict[str, float]], args: Tuple, max_memory_mb: int, queue):
+    try:
+        import resource
+        limit = max_memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (ImportError, ValueError, OSError):
+        pass  # No address-space limit on this platform
+
+    try:
+        stats = work(*args)
+        queue.put({"ok": True, "peak_mb": _maxrss_mb(), **stats})
+    except MemoryError:
+        queue.put({"ok": False, "error": f"exceeded {max_memory_mb} MB memory limit"})
+    except Exception as e:
+        queue.put({"ok": False, "error": str(e)})
+
+
+def _run_isolated(
+    work: Callable[..., Dict[str, float]], args: Tuple, output_path: str, max_memory_mb: int, timeout: float
+) -> Dict[str, float]:
+    """Run work(*args) in a memory-capped child process; peak_mb is the child's peak RSS"""
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=_run_child, args=(work, args, max_memory_mb, queue))
+
+    start = time.perf_counter()
+    process.start()
+    result = None
+    while result is None:
+        try:
+            result = queue.get(timeout=1)
+        except queue_module.Empty:
+            if not process.is_alive():
+                result = {"ok": False, "error": f"worker exited with code {process.exitcode}"}
+            elif time.perf_counter() - start > timeout:
+                result = {"ok": False, "error": f"timed out after {timeout}s"}
+    process.join(5)
+    if process.is_alive():
+        process.kill()
+        process.join()
+
+    result["seconds"] = time.perf_counter() - start
+    if not result["ok"] and os.path.exists(output_path):
+        os.remove(output_path)
+    return result
+
+
+def write_10k_text(
+    html: str,
+    path: str,
+    max_memory_mb: int = TEXT_MAX_MEMORY_MB,
+    timeout: float = TEXT_TIMEOUT
+) -> Dict[str, float]:
+    """Write the selected 10-K sections as a text file from a child process.
+
+    Runs isolated like convert_html_to_pdf so both ingest modes report the peak RSS of
+    the process doing the work.
+    """
+    return _run_isolated(_write_text, (html, path), path, max_memory_mb, timeout)
+
+
+def convert_html_to_pdf(
+    html: str,
+    base_url: str,
+    pdf_path: str,
+    max_memory_mb: int = PDF_MAX_MEMORY_MB,
+    timeout: float = PDF_TIMEOUT
+) -> Dict[str, float]:
+    """Render HTML to PDF with WeasyPrint in a memory-capped child process"""
+    return _run_isolated(_write_pdf, (html, base_url, pdf_path), pdf_path, max_memory_mb, timeout)
@@ -0,0 +1,236 @@
+"""Shared HTTP transport for API_BASE, SEC and download traffic"""
+import threading
+import time
+import weakref
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+from limiter import backend_for_host, is_failure, is_overloaded
+
+# (connect, read) timeout in seconds; LLM-backed queries can take a while to answer
+DEFAULT_TIMEOUT = (5, 180)
+
+# Connection pooling: number of host pools kept alive and connections per host
+POOL_CONNECTIONS = 10
+POOL_MAXSIZE = 16
+
+# Retry with exponential backoff on throttling and server errors
+RETRY_TOTAL = 3
+RETRY_BACKOFF = 0.5
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Requests per second, keyed by domain suffix. SEC's fair-access policy allows 10 req/s
+# across all of sec.gov, so www.sec.gov and data.sec.gov share one limiter.
+RATE_LIMITS = {
+    "sec.gov": 10,
+}
+
+# Maximum requests in flight per domain suffix (None means bounded only by the pool)
+HOST_LIMITS: Dict[str, int] = {}
+
+
+class RateLimiter:
+    """Spaces calls so that no more than `rate` start per second"""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate
+        self.next_slot = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            wait = self.next_slot - now
+            self.next_slot = max(now, self.next_slot) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+
+# Seconds spent opening connections (DNS + TCP + TLS) during the current request, per thread
+_connect_timing = threading.local()
+
+
+class _TimedHTTPConnection(HTTPConnection):
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        _connect_timing.seconds = getattr(_connect_timing, "seconds", 0.0) + time.perf_counter() - start
+
+
+class _TimedHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        _connect_timing.seconds = getattr(_connect_timing, "seconds", 0.0) + time.perf_counter() - start
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class _TimedAdapter(HTTPAdapter):
+    """HTTPAdapter whose connections report how long they took to open"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _TimedHTTPConnectionPool,
+            "https": _TimedHTTPSConnectionPool
+        }
+
+
+class _StreamSlot:
+    """Backend slot of a streamed response, held until its body has been read or the response closed"""
+
+    def __init__(self, backend, started: float, endpoint: str, overloaded: bool):
+        self.backend = backend
+        self.started = started
+        self.endpoint = endpoint
+        self.overloaded = overloaded
+        self.settled = False
+        self.lock = threading.Lock()
+
+    def settle(self, failed: bool):
+        with self.lock:
+            if self.settled:
+                return
+            self.settled = True
+        self.backend.exit(time.perf_counter() - self.started, self.overloaded or failed, failed, self.endpoint)
+
+
+def _hold_slot(response: requests.Response, slot: _StreamSlot):
+    """Settle slot when the body ends, fails partway (reported as a failure) or the response is closed"""
+    iter_content = response.iter_content
+    close = response.close
+
+    def guarded_iter_content(*args, **kwargs):
+        try:
+            yield from iter_content(*args, **kwargs)
+        except Exception:
+            slot.settle(True)
+            raise
+        slot.settle(False)
+
+    def guarded_close():
+        try:
+            close()
+        finally:
+            slot.settle(False)
+
+    # iter_lines, .content and .json() all read through iter_content
+    response.iter_content = guarded_iter_content
+    response.close = guarded_close
+    # Last resort for callers that drop a response without reading or closing it
+    weakref.finalize(response, slot.settle, False)
+
+
+def match_suffix(host: str, table: Dict[str, object]) -> Optional[str]:
+    for suffix in table:
+        if host == suffix or host.endswith("." + suffix):
+            return suffix
+    return None
+
+
+class PooledSession(requests.Session):
+    """requests.Session with keep-alive pools, default timeouts, retries, per-host limits and adaptive backend limits"""
+
+    def __init__(
+        self,
+        pool_connections: int = POOL_CONNECTIONS,
+        pool_maxsize: int = POOL_MAXSIZE,
+        timeout=DEFAULT_TIMEOUT,
+        retries: int = RETRY_TOTAL,
+        backoff_factor: float = RETRY_BACKOFF,
+        rate_limits: Dict[str, float] = None,
+        host_limits: Dict[str, int] = None
+    ):
+        super().__init__()
+        self.timeout = timeout
+
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUSES,
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+        adapter = _TimedAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=retry)
+        self.mount("http://", adapter)
+        self.mount("https://", adapter)
+
+        rate_limits = RATE_LIMITS if rate_limits is None else rate_limits
+        host_limits = HOST_LIMITS if host_limits is None else host_limits
+        self.rate_limiters = {suffix: RateLimiter(rate) for suffix, rate in rate_limits.items()}
+        self.host_semaphores = {suffix: threading.BoundedSemaphore(limit) for suffix, limit in host_limits.items()}
+
+    def request(self, method, url, **kwargs):
+        """Send a request; the response carries connect_seconds and retry_count for instrumentation.
+
+        With stream=True the backend slot is held until the body has been read or the response
+        closed, so callers should close streamed responses they do not read to the end.
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        parsed = urlparse(url)
+        host = parsed.hostname or ""
+
+        suffix = match_suffix(host, self.rate_limiters)
+        if suffix:
+            self.rate_limiters[suffix].acquire()
+
+        # Adaptive in-flight limit and circuit breaker; raises BackendUnavailable while the breaker is open
+        backend = backend_for_host(host)
+        if backend is not None:
+            backend.enter()
+
+        _connect_timing.seconds = 0.0
+        started = time.perf_counter()
+        try:
+            suffix = match_suffix(host, self.host_semaphores)
+            if not suffix:
+                response = super().request(method, url, **kwargs)
+            else:
+                with self.host_semaphores[suffix]:
+                    response = super().request(method, url, **kwargs)
+        except Exception:
+            if backend is not None:
+                backend.exit(time.perf_counter() - started, True, True, parsed.path)
+            raise
+        except BaseException:
+            if backend is not None:
+                backend.abandon()
+            raise
+
+        response.connect_seconds = _connect_timing.seconds
+        retries = getattr(response.raw, "retries", None)
+        response.retry_count = len(retries.history) if retries is not None else 0
+        if backend is None:
+            return response
+        if kwargs.get("stream") and response.ok:
+            # The outcome is not known until the body has arrived
+            _hold_slot(response, _StreamSlot(backend, started, parsed.path, is_overloaded(response)))
+        else:
+            backend.exit(time.perf_counter() - started, is_overloaded(response), is_failure(response), parsed.path)
+        return response
+
+
+_default_session = None
+_default_session_lock = threading.Lock()
+
+
+def get_session() -> PooledSession:
+    """Return the process-wide shared session, creating it on first use"""
+    global _default_session
+    with _default_session_lock:
+        if _default_session is None:
+            _default_session = PooledSession()
+        return _default_session
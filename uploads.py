@@ -0,0 +1,143 @@
+"""Streaming multipart upload bodies and a content-hash index of uploaded files"""
+import hashlib
+import json
+import mimetypes
+import os
+import threading
+import time
+import uuid
+from typing import Callable, Dict, Iterator, Optional
+
+UPLOAD_INDEX_DIR = ".cache"
+UPLOAD_INDEX_PATH = os.path.join(UPLOAD_INDEX_DIR, "uploads.json")
+
+# Bytes read from disk at a time, and the granularity of progress callbacks
+CHUNK_SIZE = 1024 * 1024
+
+# progress(bytes_sent, total_bytes)
+ProgressCallback = Callable[[int, int], None]
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class MultipartFile:
+    """multipart/form-data body for a single file, read from disk as it is sent.
+
+    Passed as `data=` to requests, the body has a known length (so no chunked encoding)
+    and never holds more than one read buffer of the file in memory.
+    """
+
+    def __init__(self, path: str, field: str = "file", progress: ProgressCallback = None):
+        self.boundary = uuid.uuid4().hex
+        file_name = os.path.basename(path)
+        file_type = mimetypes.guess_type(file_name)[0] or "application/octet-stream"
+        self.head = (
+            f"--{self.boundary}\r\n"
+            f'Content-Disposition: form-data; name="{field}"; filename="{file_name}"\r\n'
+            f"Content-Type: {file_type}\r\n\r\n"
+        ).encode("utf-8")
+        self.tail = f"\r\n--{self.boundary}--\r\n".encode("utf-8")
+        self.file_size = os.path.getsize(path)
+        self.total = len(self.head) + self.file_size + len(self.tail)
+        self.file = open(path, "rb")
+        self.position = 0
+        self.progress = progress
+        self.reported = 0
+
+    @property
+    def content_type(self) -> str:
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    def __len__(self) -> int:
+        return self.total
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            size = self.total - self.position
+        parts = []
+        file_end = len(self.head) + self.file_size
+        while size > 0 and self.position < self.total:
+            if self.position < len(self.head):
+                chunk = self.head[self.position:self.position + size]
+            elif self.position < file_end:
+                chunk = self.file.read(min(size, file_end - self.position))
+                if not chunk:
+                    raise IOError(f"{self.file.name} shrank while uploading")
+            else:
+                offset = self.position - file_end
+                chunk = self.tail[offset:offset + size]
+            parts.append(chunk)
+            self.position += len(chunk)
+            size -= len(chunk)
+
+        if self.progress and (self.position - self.reported >= CHUNK_SIZE or self.position == self.total):
+            self.reported = self.position
+            self.progress(self.position, self.total)
+        return b"".join(parts)
+
+    def __iter__(self) -> Iterator[bytes]:
+        for chunk in iter(lambda: self.read(CHUNK_SIZE), b""):
+            yield chunk
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self) -> "MultipartFile":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class UploadIndex:
+    """Maps file sha256 digests to the doc_ids they were uploaded as"""
+
+    def __init__(self, path: str = UPLOAD_INDEX_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        try:
+            with open(path) as f:
+                self.entries: Dict[str, Dict] = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.entries, f)
+        os.replace(tmp_path, self.path)
+
+    def get(self, digest: str) -> Optional[str]:
+        with self.lock:
+            entry = self.entries.get(digest)
+        return entry["doc_id"] if entry else None
+
+    def add(self, digest: str, doc_id: str, file_name: str):
+        with self.lock:
+            self.entries[digest] = {"doc_id": doc_id, "file_name": file_name, "uploaded_at": time.time()}
+            self._save()
+
+    def discard(self, digest: str):
+        with self.lock:
+            if self.entries.pop(digest, None) is not None:
+                self._save()
+
+
+_default_index = None
+_default_index_lock = threading.Lock()
+
+
+def get_upload_index() -> UploadIndex:
+    """Return the process-wide upload index"""
+    global _default_index
+    with _default_index_lock:
+        if _default_index is None:
+            _default_index = UploadIndex()
+        return _default_index